@@ -0,0 +1,85 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from stencil import SlabKernel
+
+# Roughly this many cells per tile, whatever the dimension.
+TILE_CELLS = 64
+# Above this fraction of active tiles a full dense sweep is cheaper than gathering tiles.
+FULL_SWEEP = 0.5
+
+class ActiveSet:
+    # Tracks which tiles of a dense grid can change. A tile can only change if some cell within one
+    # cell of it changed in the previous generation, so the active set is the tiles that changed last
+    # step, grown by one tile. Skipped tiles cost nothing: the back buffer already holds the same values
+    # there. Exact for deterministic rules only.
+    def __init__(self, sim, shape):
+        self.sim = sim
+        self.n = len(shape)
+        self.shape = shape
+        self.tile = min([max(1, int(round(TILE_CELLS ** (1 / self.n))))] + list(shape))
+        # Tile i of an axis covers [i * tile, (i + 1) * tile); its window is clamped inside the grid,
+        # so the last one overlaps its neighbour instead of running off the edge.
+        self.tiles = tuple(-(-d // self.tile) for d in shape)
+        self.starts = [np.minimum(np.arange(t) * self.tile, d - self.tile) for t, d in zip(self.tiles, shape)]
+        # Per-cell change flags, padded to whole tiles; the padding stays False.
+        self.diff = np.zeros(tuple(t * self.tile for t in self.tiles), dtype=bool)
+        # Kernel over a stack of tile windows, rebuilt when the number of active tiles changes.
+        self.kernel = None
+        self.reset()
+
+    def reset(self):
+        self.active = np.ones(self.tiles, dtype=bool)
+        self.active_cells = int(np.prod(self.shape))
+
+    @property
+    def sparse(self):
+        return np.count_nonzero(self.active) <= FULL_SWEEP * self.active.size
+
+    def _grow(self, changed):
+        # Axis by axis, so diagonal neighbours are reached too.
+        for axis in range(self.n):
+            lead = (slice(None),) * axis
+            grown = changed.copy()
+            if self.sim.wrap:
+                grown |= np.roll(changed, 1, axis) | np.roll(changed, -1, axis)
+            else:
+                grown[lead + (slice(1, None),)] |= changed[lead + (slice(None, -1),)]
+                grown[lead + (slice(None, -1),)] |= changed[lead + (slice(1, None),)]
+            changed = grown
+        return changed
+
+    def swept(self, curr, nxt):
+        # After a full sweep from curr to nxt the next active set comes from the per-tile differences.
+        np.not_equal(curr, nxt, out=self.diff[tuple(slice(0, d) for d in self.shape)])
+        changed = self.diff
+        for axis in range(self.n):
+            changed = changed.reshape(changed.shape[:axis] + (self.tiles[axis], self.tile) + changed.shape[axis + 1:]).any(axis=axis + 1)
+        self.active = self._grow(changed)
+        self.active_cells = int(np.prod(self.shape))
+
+    def _next(self, windows):
+        # windows: (count, *padded tile) states with a one-cell halo; returns current and next interiors.
+        if self.kernel is None or self.kernel.padded != windows.shape:
+            sim = self.sim
+            self.kernel = SlabKernel(sim.table, sim.planes, sim.offsets, sim._separable, sim.count_dtype, windows.shape,
+                                     sim.states.dtype, batch=1)
+        return windows[self.kernel.cells], self.kernel.run(windows, None)
+
+    def step(self, front, back):
+        # One generation of the active tiles from the padded front buffer (halo up to date) into the back one.
+        index = np.nonzero(self.active)
+        count = len(index[0])
+        self.active_cells = count * self.tile ** self.n
+        if count == 0:
+            return
+        starts = tuple(s[i] for s, i in zip(self.starts, index))
+        windows = sliding_window_view(front, (self.tile + 2,) * self.n)[starts]
+        curr, nxt = self._next(windows)
+        interior = (slice(1, -1),) * self.n
+        targets = sliding_window_view(back[interior], (self.tile,) * self.n, writeable=True)
+        targets[starts] = nxt
+        # Changes in the overlapping part of a clamped window are credited to that window's tile;
+        # those cells sit more than one cell away from the tile before it, so growing still covers them.
+        changed = np.zeros(self.tiles, dtype=bool)
+        changed[index] = (curr != nxt).reshape(count, -1).any(axis=1)
+        self.active = self._grow(changed)
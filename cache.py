@@ -0,0 +1,84 @@
+import os
+import shutil
+import numpy as np
+from rules import canonical_hash
+
+# Total size the cache is trimmed back to after every put(), least recently used entries first.
+CACHE_BYTES = 1 << 30
+
+class ResultCache:
+    # Content-addressed store of run results on disk. key() hashes the canonical form of whatever
+    # decides a result (setup, size, steps, seed, ENGINE_VERSION, ...); each entry is a directory
+    # holding the arrays as result.npz plus any derived files such as plots. Reads refresh the
+    # entry's modification time, which is what eviction orders by.
+    def __init__(self, path, max_bytes=CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(**parts):
+        return canonical_hash(parts)
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def file(self, key, name):
+        # Path of a derived file of a stored entry, or None.
+        path = os.path.join(self._entry(key), name)
+        return path if os.path.exists(path) else None
+
+    def get(self, key):
+        # Arrays stored under key as a dict, or None on a miss.
+        entry = self._entry(key)
+        try:
+            with np.load(os.path.join(entry, "result.npz")) as data:
+                arrays = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+        os.utime(entry)
+        return arrays
+
+    def put(self, key, arrays, files=None):
+        # Stores arrays and copies of the given {name: path} files. The entry is assembled in a
+        # temporary directory and renamed into place, so readers never see half of one.
+        tmp = self._entry(key) + f".tmp{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.savez(os.path.join(tmp, "result.npz"), **arrays)
+        for name, source in (files or {}).items():
+            shutil.copyfile(source, os.path.join(tmp, name))
+        self.invalidate(key)
+        os.replace(tmp, self._entry(key))
+        self.evict()
+
+    def invalidate(self, key=None):
+        # Drops one entry, or every entry when key is None.
+        if key is None:
+            for name in os.listdir(self.path):
+                shutil.rmtree(self._entry(name), ignore_errors=True)
+            return
+        shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.path):
+            entry = self._entry(name)
+            if ".tmp" in name or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, name))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry(name), ignore_errors=True)
+            total -= size
+
+    @property
+    def nbytes(self):
+        return sum(size for _, size, _ in self._entries())
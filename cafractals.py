@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from simulation import Simulation
+from recorder import TrajectoryRecorder
+import setups
+
+ENGINES = ["auto", "dense", "elementary", "bitpack", "hashlife", "sparse", "parallel", "threads", "active"]
+
+def peak_memory():
+    # Peak resident set size of this process in bytes, or None where the resource module is missing.
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class Timer:
+    # Wall time per named phase, in the order the phases ran.
+    def __init__(self):
+        self.phases = {}
+
+    def phase(self, name):
+        return _Phase(self.phases, name)
+
+class _Phase:
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.phases[self.name] = self.phases.get(self.name, 0.0) + time.perf_counter() - self.start
+
+def run(name, size, steps, dims=None, init_steps=0, seed=None, engine="auto", wrap=False,
+        history=None, trajectory=None, stride=1, final=None, plot=None, engine_options=None, density=None):
+    # One headless run of a named setup (anything setups.setups resolves, e.g. "B3/S23" or "Rule 110").
+    # The sinks are output paths, each None to skip it: history (.npy of per-step state counts),
+    # trajectory (recorder directory), final (.npy of the last grid) and plot (stacked .png).
+    # engine_options are the engine's tuning knobs, see simulation.ENGINE_OPTIONS; density starts from
+    # live cells at that density instead of uniformly random states.
+    # Returns the report: cells, generations, cells/s over the stepping phase, phase timings, peak memory.
+    timer = Timer()
+    with timer.phase("setup"):
+        if name not in setups.setups:
+            raise ValueError(f"Unknown setup: {name}")
+        setup = setups.setups[name]
+        if dims is not None and setup.n != dims:
+            raise ValueError(f"{name} is a {setup.n}D setup, not {dims}D")
+    with timer.phase("allocate"):
+        sim = Simulation(setup, size, history is not None or plot is not None, engine=engine, wrap=wrap, seed=seed,
+                         engine_options=engine_options, density=density)
+    with timer.phase("warmup"):
+        for _ in range(init_steps):
+            sim.step()
+        sim.clear_history()
+        recorder = TrajectoryRecorder(sim, trajectory, stride) if trajectory else None
+    start = sim.generation
+    with timer.phase("step"):
+        for _ in range(steps):
+            sim.step()
+        # Engines that run ahead of the dense grid only catch up here; that is part of stepping.
+        # The sparse and hashlife engines hold the result as coordinates and only rasterise for --final.
+        coordinates = hasattr(sim.engine, "live_cells")
+        grid = sim._dense() if final is not None or not coordinates else None
+    with timer.phase("write"):
+        if recorder is not None:
+            recorder.close()
+        if history is not None:
+            np.save(history, sim.history)
+        if final is not None:
+            np.save(final, grid)
+        if plot is not None:
+            from sweep import plot as stacked_plot
+            stacked_plot(sim.history, setup, plot, f"{name}, size {size}, seed {seed}")
+    cells = int(np.prod(sim.shape))
+    generations = sim.generation - start
+    seconds = timer.phases["step"]
+    return {"setup": name, "n": setup.n, "size": size, "engine": sim.engine_name, "cells": cells, "generations": generations,
+            "cells_per_second": cells * generations / seconds if seconds > 0 else float("inf"),
+            "phases": timer.phases, "peak_memory": peak_memory()}
+
+def print_report(report):
+    print(f"{report['setup']}: {report['n']}D, {report['cells']} cells, {report['generations']} generations "
+          f"on the {report['engine']} engine")
+    print(f"{report['cells_per_second']:.4g} cells/s")
+    for phase, seconds in report["phases"].items():
+        print(f"  {phase:9s}{seconds:9.3f}s")
+    if report["peak_memory"] is not None:
+        print(f"peak memory {report['peak_memory'] / 2**20:.1f} MiB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cafractals", description="Headless cellular automaton runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    listing = commands.add_parser("list", help="list the named setups")
+    listing.add_argument("--dims", type=int, default=None, help="only setups of this many dimensions")
+
+    runner = commands.add_parser("run", help="run one setup and report throughput")
+    runner.add_argument("setup", help='setup name, or a rule such as "B3/S23", "Rule 110" or "Cyclic 7"')
+    runner.add_argument("--dims", type=int, default=None, help="fail unless the setup has this many dimensions")
+    runner.add_argument("--size", type=int, default=30, help="cells per side")
+    runner.add_argument("--steps", type=int, default=2000)
+    runner.add_argument("--init-steps", type=int, default=0, help="steps before history and trajectory start")
+    runner.add_argument("--seed", type=int, default=0)
+    runner.add_argument("--engine", choices=ENGINES, default="auto")
+    runner.add_argument("--wrap", action="store_true", help="periodic boundary")
+    runner.add_argument("--density", type=float, default=None, help="start with live cells at this density")
+    runner.add_argument("--workers", type=int, default=None, help="parallel/threads engines: worker count")
+    runner.add_argument("--band-rows", type=int, default=None, help="threads engine: rows per band")
+    runner.add_argument("--step-log2", type=int, default=None, help="hashlife engine: 2**k generations per step")
+    runner.add_argument("--history", default=None, help=".npy file for the per-step state counts")
+    runner.add_argument("--trajectory", default=None, help="directory to stream every grid to")
+    runner.add_argument("--stride", type=int, default=1, help="steps per trajectory frame")
+    runner.add_argument("--final", default=None, help=".npy file for the last grid")
+    runner.add_argument("--plot", default=None, help=".png file for a stacked plot of the state counts")
+    runner.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name in setups.setups:
+            if args.dims is None or setups.setups[name].n == args.dims:
+                print(name)
+        return 0
+
+    options = {key: getattr(args, key) for key in ("workers", "band_rows", "step_log2")
+               if getattr(args, key) is not None}
+    try:
+        report = run(args.setup, args.size, args.steps, args.dims, args.init_steps, args.seed, args.engine, args.wrap,
+                     args.history, args.trajectory, args.stride, args.final, args.plot, options,
+                     args.density)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
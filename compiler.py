@@ -0,0 +1,262 @@
+import numpy as np
+from rules import ClassicRule, ProbabilisticRule, RandomRule, WeightedRandomRule, MajorityRule
+
+# Tables above this many entries are not worth building, the per-cell path is used instead.
+MAX_TABLE_SIZE = 1 << 22
+
+def global_uniform(shape, out=None):
+    # Default draw source of apply(): the global numpy RNG. Simulations pass their own, which
+    # fills out in place.
+    values = np.random.random(shape)
+    if out is None:
+        return values
+    out[...] = values
+    return out
+
+def workspace_bytes(table):
+    # Bytes per cell of table.workspace(), for memory estimates.
+    return sum(a.nbytes for a in table.workspace((1,)).values())
+
+class RuleTable:
+    # Lookup table form of a first-match Rules chain made only of ClassicRule/ProbabilisticRule.
+    # Index of a cell is state * base**m + sum(count_j * base**(m-1-j)), where count_j is the
+    # count of neighbours in the plane select[state, j] picks.
+    def __init__(self, rules, state_count, max_neighbors):
+        self.state_count = state_count
+        self.base = max_neighbors + 1
+
+        per_state = [[] for _ in range(state_count)]
+        for rule in rules.rules:
+            if 0 <= rule.start < state_count:
+                per_state[rule.start].append(rule)
+
+        refs = []
+        for rs in per_state:
+            keys = []
+            for rule in rs:
+                for key in self._conditions(rule):
+                    if key not in keys:
+                        keys.append(key)
+            refs.append(keys)
+        self.width = max((len(r) for r in refs), default=0)
+        self.size = state_count * self.base ** self.width
+        if self.size > MAX_TABLE_SIZE:
+            raise ValueError("rule table too large")
+
+        for keys in refs:
+            for key in keys:
+                if not 0 <= key < state_count:
+                    raise ValueError(f"rule references unknown state {key}")
+        self.planes = sorted({int(key) for keys in refs for key in keys})
+        plane_of = {s: i for i, s in enumerate(self.planes)}
+
+        # Column j of select[s] is the count plane that goes into digit j for cells in state s.
+        # Unused digits point at plane 0, the table is constant along them.
+        self.select = np.zeros((state_count, self.width), dtype=np.intp)
+        for s, keys in enumerate(refs):
+            for j, key in enumerate(keys):
+                self.select[s, j] = plane_of[key]
+        self.fixed = [bool(np.all(self.select[:, j] == self.select[0, j])) for j in range(self.width)]
+
+        shape = (state_count,) + (self.base,) * self.width
+        digits = np.indices((self.base,) * self.width) if self.width else np.zeros((0,), dtype=np.intp)
+        self.next = np.empty(shape, dtype=np.min_scalar_type(state_count))
+        self.prob = np.ones(shape, dtype=np.float64)
+        for s in range(state_count):
+            nxt = np.full(shape[1:], s, dtype=self.next.dtype)
+            prob = np.ones(shape[1:], dtype=np.float64)
+            free = np.ones(shape[1:], dtype=bool)
+            for rule in per_state[s]:
+                match = free.copy()
+                for key, values in self._conditions(rule).items():
+                    hit = np.isin(digits[refs[s].index(key)], list(values))
+                    match &= hit if rule.positivity else ~hit
+                nxt[match] = rule.end
+                if isinstance(rule, ProbabilisticRule):
+                    prob[match] = rule.probability
+                free &= ~match
+            self.next[s] = nxt
+            self.prob[s] = prob
+        self.next = self.next.ravel()
+        self.prob = self.prob.ravel()
+        self.deterministic = bool(np.all(self.prob >= 1.0))
+
+    @staticmethod
+    def _conditions(rule):
+        if isinstance(rule, ClassicRule):
+            return rule.values
+        return rule.neighbor_counts
+
+    def workspace(self, shape, count_dtype=np.uint8):
+        # Scratch buffers for index/apply, reusable across steps of the same shape. Indices are intp
+        # and the output contiguous, so np.take (in clip mode) never makes a converted or buffered copy.
+        work = {"index": np.empty(shape, dtype=np.intp), "next": np.empty(shape, dtype=self.next.dtype)}
+        if not all(self.fixed):
+            work["cells"] = np.arange(int(np.prod(shape)), dtype=np.intp).reshape(shape)
+            work["state"] = np.empty(shape, dtype=np.intp)
+            work["gather"] = np.empty(shape, dtype=np.intp)
+            work["digit"] = np.empty(shape, dtype=np.uint8)
+        if not self.deterministic:
+            work["prob"] = np.empty(shape, dtype=np.float64)
+            work["uniform"] = np.empty(shape, dtype=np.float64)
+            work["keep"] = np.empty(shape, dtype=bool)
+        return work
+
+    def index(self, curr, counts, work=None):
+        # curr: state indices, counts: per-plane neighbour counts stacked on axis 0 (ordered as self.planes)
+        if work is None:
+            work = self.workspace(curr.shape)
+        idx = work["index"]
+        np.copyto(idx, curr)
+        if not all(self.fixed):
+            np.copyto(work["state"], curr)
+        for j in range(self.width):
+            if self.fixed[j]:
+                digit = counts[self.select[0, j]]
+            else:
+                # Plane depends on the cell's state: gather from the flattened stack.
+                gather = work["gather"]
+                np.take(self.select[:, j], work["state"], out=gather, mode='clip')
+                gather *= work["cells"].size
+                gather += work["cells"]
+                digit = np.take(counts.reshape(-1), gather, out=work["digit"], mode='clip')
+            idx *= self.base
+            idx += digit
+        return idx
+
+    def apply(self, curr, counts, random=global_uniform, out=None, work=None):
+        # random(shape, out) fills out with uniform [0, 1) draws.
+        if work is None:
+            work = self.workspace(curr.shape)
+        if out is None:
+            out = np.empty(curr.shape, dtype=self.next.dtype)
+        idx = self.index(curr, counts, work)
+        if out.flags.c_contiguous:
+            np.take(self.next, idx, out=out, mode='clip')
+        else:
+            np.copyto(out, np.take(self.next, idx, out=work["next"], mode='clip'))
+        if not self.deterministic:
+            prob = np.take(self.prob, idx, out=work["prob"], mode='clip')
+            uniform = random(curr.shape, out=work["uniform"])
+            keep = np.greater_equal(uniform, prob, out=work["keep"])
+            np.copyto(out, curr, where=keep)
+        return out
+
+class CountKernel:
+    # Whole-grid form of a rule that is not a lookup table, with the same interface as RuleTable.
+    # It sees the neighbour counts of every state, stacked on axis 0 in state order.
+    fixed = []
+    deterministic = False
+
+    def __init__(self, state_count):
+        self.state_count = state_count
+        self.planes = list(range(state_count))
+
+    def workspace(self, shape, count_dtype=np.uint8):
+        return {}
+
+class RandomKernel(CountKernel):
+    # RandomRule: a uniformly random state for every cell.
+    def __init__(self, state_count):
+        super().__init__(state_count)
+        self.planes = []
+
+    def workspace(self, shape, count_dtype=np.uint8):
+        return {"uniform": np.empty(shape, dtype=np.float64)}
+
+    def apply(self, curr, counts, random=global_uniform, out=None, work=None):
+        if work is None:
+            work = self.workspace(curr.shape)
+        if out is None:
+            out = np.empty(curr.shape, dtype=curr.dtype)
+        uniform = random(curr.shape, out=work["uniform"])
+        np.multiply(uniform, self.state_count, out=uniform)
+        np.copyto(out, uniform, casting='unsafe')
+        return out
+
+class WeightedRandomKernel(CountKernel):
+    # WeightedRandomRule: state s with probability count_s / total, from one uniform draw per cell
+    # compared against the running sum of the count planes. Cells without neighbours keep their state.
+    def workspace(self, shape, count_dtype=np.uint8):
+        return {"cumulative": np.empty((self.state_count,) + tuple(shape), dtype=np.int32),
+                "uniform": np.empty(shape, dtype=np.float64), "hit": np.empty(shape, dtype=bool)}
+
+    def apply(self, curr, counts, random=global_uniform, out=None, work=None):
+        if work is None:
+            work = self.workspace(curr.shape)
+        if out is None:
+            out = np.empty(curr.shape, dtype=curr.dtype)
+        cumulative = work["cumulative"]
+        np.copyto(cumulative[0], counts[0])
+        for state in range(1, len(counts)):
+            np.add(cumulative[state - 1], counts[state], out=cumulative[state])
+        threshold = random(curr.shape, out=work["uniform"])
+        np.multiply(threshold, cumulative[-1], out=threshold)
+        # The picked state is the number of running sums at or below the threshold.
+        hit = work["hit"]
+        out.fill(0)
+        for running in cumulative[:-1]:
+            np.less_equal(running, threshold, out=hit)
+            np.add(out, hit, out=out, casting='unsafe')
+        np.equal(cumulative[-1], 0, out=hit)
+        np.copyto(out, curr, where=hit)
+        return out
+
+class MajorityKernel(CountKernel):
+    # MajorityRule: the state with the most neighbours; when that maximum is shared the rule does
+    # not apply and the cell keeps its state, as in the per-cell scan.
+    deterministic = True
+
+    def workspace(self, shape, count_dtype=np.uint8):
+        return {"best": np.empty(shape, dtype=count_dtype), "ties": np.empty(shape, dtype=np.uint8),
+                "hit": np.empty(shape, dtype=bool)}
+
+    def apply(self, curr, counts, random=global_uniform, out=None, work=None):
+        if work is None:
+            work = self.workspace(curr.shape, counts.dtype)
+        if out is None:
+            out = np.empty(curr.shape, dtype=curr.dtype)
+        best = np.max(counts, axis=0, out=work["best"])
+        ties, hit = work["ties"], work["hit"]
+        ties.fill(0)
+        # Walking the planes backwards leaves the first state reaching the maximum in out, as argmax would.
+        for state in reversed(range(len(counts))):
+            np.equal(counts[state], best, out=hit)
+            np.copyto(out, state, where=hit, casting='unsafe')
+            np.add(ties, hit, out=ties, casting='unsafe')
+        np.greater(ties, 1, out=hit)
+        np.copyto(out, curr, where=hit)
+        return out
+
+KERNELS = {RandomRule: RandomKernel, WeightedRandomRule: WeightedRandomKernel, MajorityRule: MajorityKernel}
+
+def _kernel(rules, state_count):
+    # A chain led by one of these rules compiles to its kernel. Random and weighted rules always
+    # answer, so anything after them is dead; MajorityRule can pass, so it must stand alone.
+    if not rules.rules or type(rules.rules[0]) not in KERNELS:
+        return None
+    first = type(rules.rules[0])
+    if first is MajorityRule and len(rules.rules) > 1:
+        return None
+    return KERNELS[first](state_count)
+
+def compile_rules(rules, state_count, max_neighbors):
+    kernel = _kernel(rules, state_count)
+    if kernel is not None:
+        return kernel
+    if not all(type(rule) in (ClassicRule, ProbabilisticRule) for rule in rules.rules):
+        return None
+    try:
+        return RuleTable(rules, state_count, max_neighbors)
+    except ValueError:
+        return None
+
+def birth_survival(table):
+    # (birth, survival) neighbour-count lists when the table is a deterministic two-state rule
+    # that only looks at the number of live (state 1) neighbours, otherwise None.
+    if table is None or table.state_count != 2 or not table.deterministic or table.planes not in ([], [1]):
+        return None
+    nxt = np.broadcast_to(table.next.reshape(2, -1), (2, table.base))
+    birth = [t for t in range(table.base) if nxt[0, t] == 1]
+    survival = [t for t in range(table.base) if nxt[1, t] == 1]
+    return birth, survival
@@ -1,18 +1,31 @@
 #!/usr/bin/env python
 
 import numpy as np
-from scipy.signal import correlate
-from simulation import Simulation, SimulationSetup
+from simulation import Simulation, SimulationSetup, ENGINE_VERSION
+from cache import ResultCache
 import setups
 import sys
 
 INIT_STEPS = 25
 SIZE = 30
 STEPS = 2000
+# Independent runs stepped together; the lag is reported over all of them.
+REPLICAS = 200
+SEED = 0
+# Directory of cached statistics, or None to always recompute.
+CACHE_DIR = "cache"
 
 def run_time_correlation(name, setup):
     print(f"Running setup: {name}")
-    sim = Simulation(setup, SIZE, True)
+    cache = ResultCache(CACHE_DIR) if CACHE_DIR else None
+    key = ResultCache.key(script="coorealtion", setup=setup, size=SIZE, steps=STEPS, init_steps=INIT_STEPS,
+                          replicas=REPLICAS, seed=SEED, engine=ENGINE_VERSION)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        print_statistics(cached["time_corrs"], cached["best_lags"])
+        return
+
+    sim = Simulation(setup, SIZE, True, replicas=REPLICAS, seed=SEED)
 
     # Wstępne kroki
     for _ in range(INIT_STEPS):
@@ -23,7 +36,7 @@ def run_time_correlation(name, setup):
     for _ in range(STEPS):
         sim.step()
 
-    history = np.array(sim.history)  # shape: (steps, n_states)
+    history = sim.history_array()  # shape: (replicas, steps, n_states)
     state_labels = setup.names
 
     try:
@@ -33,22 +46,32 @@ def run_time_correlation(name, setup):
         print("Setup does not contain Prey/Predator states. Skipping.")
         return
 
-    prey_counts = history[:, prey_idx]
-    predator_counts = history[:, predator_idx]
+    # SciPy is only loaded when the statistics are not cached.
+    from scipy.signal import correlate
+    time_corrs = []
+    best_lags = []
+    for replica in history:
+        prey_counts = replica[:, prey_idx]
+        predator_counts = replica[:, predator_idx]
+
+        # Korelacja Pearsona
+        time_corrs.append(np.corrcoef(prey_counts, predator_counts)[0,1])
 
-    # Korelacja Pearsona
-    time_corr = np.corrcoef(prey_counts, predator_counts)[0,1]
+        # Cross-correlation i lag
+        prey_mean = prey_counts - np.mean(prey_counts)
+        predator_mean = predator_counts - np.mean(predator_counts)
+        cross_corr = correlate(predator_mean, prey_mean, mode='full')
+        lags = np.arange(-len(prey_counts)+1, len(prey_counts))
+        best_lags.append(lags[np.argmax(cross_corr)])
 
-    # Cross-correlation i lag
-    prey_mean = prey_counts - np.mean(prey_counts)
-    predator_mean = predator_counts - np.mean(predator_counts)
-    cross_corr = correlate(predator_mean, prey_mean, mode='full')
-    lags = np.arange(-len(prey_counts)+1, len(prey_counts))
-    best_lag = lags[np.argmax(cross_corr)]
+    if cache is not None:
+        cache.put(key, {"time_corrs": np.array(time_corrs), "best_lags": np.array(best_lags)})
+    print_statistics(time_corrs, best_lags)
 
+def print_statistics(time_corrs, best_lags):
     # Wyniki
-    print(f"Time correlation (Pearson) Prey vs Predator: {time_corr:.3f}")
-    print(f"Maximum cross-correlation lag: {best_lag} steps")
+    print(f"Time correlation (Pearson) Prey vs Predator: {np.nanmean(time_corrs):.3f} ± {np.nanstd(time_corrs):.3f} over {REPLICAS} runs")
+    print(f"Maximum cross-correlation lag: {np.mean(best_lags):.1f} ± {np.std(best_lags):.1f} steps (median {np.median(best_lags):.0f})")
 
 name = "Prey-Predator"
 selected_name, selected_setup = name, setups.setups[name]
@@ -0,0 +1,77 @@
+from collections import deque
+import numpy as np
+
+# Recent grid hashes kept for matching; cycles longer than this many steps go unnoticed.
+CYCLE_WINDOW = 4096
+
+def _mix(x):
+    # splitmix64 finaliser: a fixed pseudo-random 64-bit key for every (cell, state) pair.
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+class CycleDetector:
+    # Zobrist hash of the grid: the XOR of one key per (cell, state). A step only re-keys the cells
+    # that changed, and the last `window` hashes are kept with their generation. When a hash comes
+    # back the deterministic trajectory has entered a cycle: `period` generations long, first reached
+    # `transient` generations after the detector started (an upper bound once the first visit has
+    # dropped out of the window). Grid edits other than steps should be followed by clear().
+    def __init__(self, sim, window=CYCLE_WINDOW):
+        if not sim.deterministic:
+            raise ValueError("cycle detection needs deterministic rules")
+        if sim.replicas:
+            raise ValueError("cycle detection needs a single grid, not replicas")
+        if hasattr(sim.engine, "live_cells"):
+            raise ValueError("cycle detection needs a bounded grid, not the sparse or hashlife engine")
+        self.sim = sim
+        self.window = window
+        self._stride = np.uint64(sim.state_count + 1)
+        self.clear()
+        sim.cycle = self
+
+    def _keys(self, cells, states):
+        return _mix(cells.astype(np.uint64) * self._stride + states.astype(np.uint64))
+
+    def clear(self):
+        grid = self.sim._dense()
+        self.prev = grid.reshape(-1).copy()
+        self.hash = int(np.bitwise_xor.reduce(self._keys(np.arange(self.prev.size), self.prev)))
+        self.start = self.sim.generation
+        self.seen = {self.hash: self.start}
+        self.order = deque([self.hash])
+        self.period = None
+        self.transient = None
+
+    def update(self, grid, generation):
+        if self.period is not None:
+            return
+        curr = grid.reshape(-1)
+        changed = np.flatnonzero(curr != self.prev)
+        if len(changed):
+            keys = self._keys(changed, self.prev[changed]) ^ self._keys(changed, curr[changed])
+            self.hash ^= int(np.bitwise_xor.reduce(keys))
+            self.prev[changed] = curr[changed]
+        first = self.seen.get(self.hash)
+        if first is not None:
+            self.period = generation - first
+            self.transient = first - self.start
+            return
+        self.seen[self.hash] = generation
+        self.order.append(self.hash)
+        if len(self.order) > self.window:
+            del self.seen[self.order.popleft()]
+
+    @property
+    def fixed_point(self):
+        return self.period == 1
+
+    def extrapolate(self, rows, length):
+        # Extends rows recorded once per generation up to the detection (history counts, frames)
+        # to `length` rows by repeating the last period of them.
+        if len(rows) >= length:
+            return rows[:length]
+        if self.period is None or len(rows) < self.period:
+            raise ValueError("need a detected cycle and at least one period of rows")
+        cycle = rows[len(rows) - self.period:]
+        return np.concatenate([rows, cycle[np.arange(length - len(rows)) % self.period]])
@@ -0,0 +1,208 @@
+import numpy as np
+
+# Every this many frames one is stored whole, so reaching any frame decodes at most this many deltas.
+KEYFRAME_INTERVAL = 64
+# Bytes the encoded-frame buffer starts with; it doubles whenever it fills up.
+DATA_CAPACITY = 1 << 16
+
+# Frame encodings: bit-packed cells, run-length rows, and cells changed since the previous frame.
+RAW, RLE, DELTA = 0, 1, 2
+
+def _grow(buffer, needed):
+    if needed <= len(buffer):
+        return buffer
+    grown = np.zeros(max(needed, 2 * len(buffer)), dtype=buffer.dtype)
+    grown[:len(buffer)] = buffer
+    return grown
+
+class FrameHistory:
+    # Space-time history of state-index frames (uint8, or uint16 above 256 states), compressed. Frame i
+    # is stored whole (bit-packed or run-length encoded) when i is a multiple of keyframe_interval,
+    # otherwise as whichever of changed-cell XOR delta, packed or run-length is smallest. history[i]
+    # decodes from the last whole frame at or before i, so a seek costs at most keyframe_interval
+    # deltas; iterating or window() decodes each frame once.
+    def __init__(self, frame_shape, state_count=256, keyframe_interval=KEYFRAME_INTERVAL):
+        self.frame_shape = tuple(frame_shape)
+        self.size = int(np.prod(self.frame_shape))
+        self.keyframe_interval = keyframe_interval
+        if state_count > 1 << 16:
+            raise ValueError("frame history holds at most 65536 states")
+        self.bits = next(b for b in (1, 2, 4, 8, 16) if state_count <= 1 << b)
+        # Cells are bit-packed below 8 bits and stored as raw bytes of their values from 8 bits on.
+        self._dtype = np.dtype(np.uint16 if self.bits == 16 else np.uint8)
+        self._per_byte = max(1, 8 // self.bits)
+        self._shifts = (np.arange(self._per_byte, dtype=np.uint8) * self.bits)[::-1]
+        self._index_dtype = np.dtype(np.uint16 if self.size <= 1 << 16 else np.uint32)
+        # Two state values XOR to 1 wherever they differ, so binary deltas store positions only.
+        self._delta_values = self.bits > 1
+        # Per frame: encoded length << 2 | encoding.
+        largest = max(self.size * (self._index_dtype.itemsize + self._dtype.itemsize), -(-self.size * self.bits // 8))
+        self._lengths = np.zeros(256, dtype=np.min_scalar_type(largest << 2 | 3))
+        self._data = np.zeros(DATA_CAPACITY, dtype=np.uint8)
+        # Byte offset of every keyframe.
+        self._keys = np.zeros(16, dtype=np.int64)
+        self._count = 0
+        self._end = 0
+        self._last = None
+        # Run-start flags, reused by every _rle() call.
+        self._runs = np.ones(self.size, dtype=bool)
+
+    def __len__(self):
+        return self._count
+
+    # Encoders return the payload as a uint8 array.
+    def _pack(self, frame):
+        if self.bits >= 8:
+            return frame.view(np.uint8)
+        if self.bits == 1:
+            return np.packbits(frame)
+        cells = np.zeros(-(-self.size // self._per_byte) * self._per_byte, dtype=np.uint8)
+        cells[:self.size] = frame
+        return np.bitwise_or.reduce(cells.reshape(-1, self._per_byte) << self._shifts, axis=1)
+
+    def _unpack(self, payload):
+        if self.bits >= 8:
+            return payload.view(self._dtype).copy()
+        if self.bits == 1:
+            return np.unpackbits(payload, count=self.size)
+        return ((payload[:, None] >> self._shifts) & ((1 << self.bits) - 1)).reshape(-1)[:self.size]
+
+    def _rle(self, frame):
+        runs = self._runs
+        np.not_equal(frame[1:], frame[:-1], out=runs[1:])
+        starts = np.flatnonzero(runs)
+        return np.concatenate([starts.astype(self._index_dtype).view(np.uint8), frame[starts].view(np.uint8)])
+
+    def _unrle(self, payload):
+        count = len(payload) // (self._index_dtype.itemsize + self._dtype.itemsize)
+        starts = payload[:count * self._index_dtype.itemsize].view(self._index_dtype)
+        values = payload[count * self._index_dtype.itemsize:].view(self._dtype)
+        return np.repeat(values, np.diff(starts, append=self.size))
+
+    def _delta(self, frame):
+        changed = np.flatnonzero(frame != self._last)
+        parts = [changed.astype(self._index_dtype).view(np.uint8)]
+        if self._delta_values:
+            parts.append((frame[changed] ^ self._last[changed]).view(np.uint8))
+        return np.concatenate(parts)
+
+    def _undelta(self, payload, frame):
+        width = self._index_dtype.itemsize + self._delta_values * self._dtype.itemsize
+        count = len(payload) // width
+        changed = payload[:count * self._index_dtype.itemsize].view(self._index_dtype)
+        if self._delta_values:
+            frame[changed] ^= payload[count * self._index_dtype.itemsize:].view(self._dtype)
+        else:
+            frame[changed] ^= np.uint8(1)
+
+    def append(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=self._dtype).reshape(-1)
+        if frame.size != self.size:
+            raise ValueError(f"frame of {frame.size} cells, history holds {self.size}")
+        candidates = [(RAW, self._pack(frame)), (RLE, self._rle(frame))]
+        if self._count % self.keyframe_interval == 0:
+            key = self._count // self.keyframe_interval
+            self._keys = _grow(self._keys, key + 1)
+            self._keys[key] = self._end
+        else:
+            candidates.append((DELTA, self._delta(frame)))
+        kind, payload = min(candidates, key=lambda c: len(c[1]))
+        self._data = _grow(self._data, self._end + len(payload))
+        self._data[self._end:self._end + len(payload)] = payload
+        self._lengths = _grow(self._lengths, self._count + 1)
+        self._lengths[self._count] = len(payload) << 2 | kind
+        self._end += len(payload)
+        self._count += 1
+        self._last = frame.copy()
+
+    def _decode(self, start, stop):
+        # Yields frames start..stop-1, each a fresh flat array.
+        key = start - start % self.keyframe_interval
+        codes = self._lengths[key:stop].astype(np.int64)
+        ends = self._keys[key // self.keyframe_interval] + np.cumsum(codes >> 2)
+        kinds = codes & 3
+        # Latest whole frame at or before start; the keyframe always is one.
+        first = key + int(np.flatnonzero(kinds[:start - key + 1] != DELTA)[-1])
+        frame = None
+        for i in range(first, stop):
+            payload = self._data[ends[i - key] - (codes[i - key] >> 2):ends[i - key]]
+            kind = kinds[i - key]
+            if kind == RAW:
+                frame = self._unpack(payload)
+            elif kind == RLE:
+                frame = self._unrle(payload)
+            else:
+                frame = frame.copy() if i > start else frame
+                self._undelta(payload, frame)
+            if i >= start:
+                yield frame
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            return self.window(start, stop)[::step]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return next(self._decode(index, index + 1)).reshape(self.frame_shape)
+
+    def __iter__(self):
+        for frame in self._decode(0, self._count) if self._count else ():
+            yield frame.reshape(self.frame_shape)
+
+    def window(self, start, stop):
+        # Frames [start, stop) as one (stop - start, *frame_shape) array.
+        out = np.empty((max(0, stop - start),) + self.frame_shape, dtype=self._dtype)
+        if stop > start:
+            for row, frame in zip(out, self._decode(start, stop)):
+                row.reshape(-1)[:] = frame
+        return out
+
+    def truncate(self, length):
+        # Drops every frame from `length` on, so the next append continues from frame length - 1.
+        if length >= self._count:
+            return
+        if length == 0:
+            self._count = self._end = 0
+            self._last = None
+            return
+        key = (length - 1) - (length - 1) % self.keyframe_interval
+        self._end = int(self._keys[key // self.keyframe_interval] + (self._lengths[key:length].astype(np.int64) >> 2).sum())
+        self._last = self[length - 1].reshape(-1).copy()
+        self._count = length
+
+    def arrays(self):
+        # The encoded frames as plain arrays, for saving; from_arrays() turns them back into a history.
+        keys = -(-self._count // self.keyframe_interval)
+        return {"shape": np.array(self.frame_shape), "params": np.array([self.bits, self.keyframe_interval]),
+                "data": self._data[:self._end], "lengths": self._lengths[:self._count], "keys": self._keys[:keys]}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        bits, keyframe_interval = (int(v) for v in arrays["params"])
+        history = cls(tuple(int(v) for v in arrays["shape"]), 1 << bits, keyframe_interval)
+        history._data = _grow(history._data, len(arrays["data"]))
+        history._data[:len(arrays["data"])] = arrays["data"]
+        history._lengths = _grow(history._lengths, len(arrays["lengths"]))
+        history._lengths[:len(arrays["lengths"])] = arrays["lengths"]
+        history._keys = _grow(history._keys, len(arrays["keys"]))
+        history._keys[:len(arrays["keys"])] = arrays["keys"]
+        history._end = len(arrays["data"])
+        history._count = len(arrays["lengths"])
+        if history._count:
+            history._last = history[-1].reshape(-1).copy()
+        return history
+
+    @property
+    def nbytes(self):
+        keys = -(-self._count // self.keyframe_interval)
+        return self._end + self._count * self._lengths.itemsize + keys * self._keys.itemsize
+
+    @property
+    def dense_nbytes(self):
+        return self._count * self.size * self._dtype.itemsize
+
+    @property
+    def compression_ratio(self):
+        return self.dense_nbytes / self.nbytes if self._count else 1.0
@@ -1,14 +1,18 @@
 #!/usr/bin/env python
 
+import os
+import shutil
 import numpy as np
-import matplotlib.pyplot as plt
 
-from simulation import Simulation, SimulationSetup
+from simulation import Simulation, SimulationSetup, ENGINE_VERSION
+from cache import ResultCache
+from recorder import TrajectoryRecorder
 import setups
 import sys
 
 def pick_setup(setups):
-    setup_list = list(setups.items())
+    # Only the chosen setup is built.
+    setup_list = list(setups)
     n_setups = len(setup_list)
 
     if len(sys.argv) > 1:
@@ -18,50 +22,90 @@ def pick_setup(setups):
             if idx == -1:
                 # Special case: run all setups
                 print("Running all setups...")
-                return "ALL", setup_list
+                return "ALL", setups.items()
             elif 0 <= idx < n_setups:
-                name, s = setup_list[idx]
+                name = setup_list[idx]
                 print(f"Using setup #{idx}: {name}")
-                return name, s
+                return name, setups[name]
             else:
                 print(f"Index {idx} out of range. Asking for input...")
         except ValueError:
             print(f"Argument '{arg}' is not a valid number. Asking for input...")
 
     print("Available setups:")
-    for i, (name, _) in enumerate(setup_list):
+    for i, name in enumerate(setup_list):
         print(f"{i}: {name}")
     try:
         idx_input = input(f"Enter setup number [0-{n_setups-1}] (default 0): ")
         idx = int(idx_input)
         if idx == -1:
             print("Running all setups...")
-            return "ALL", setup_list
+            return "ALL", setups.items()
         elif 0 <= idx < n_setups:
-            name, s = setup_list[idx]
+            name = setup_list[idx]
             print(f"Using setup #{idx}: {name}")
-            return name, s
+            return name, setups[name]
         else:
             print(f"Invalid number. Using default setup 0.")
     except (ValueError, EOFError):
         print("No valid input. Using default setup 0.")
 
     # 3. Fallback to first setup
-    name, s = setup_list[0]
+    name = setup_list[0]
     print(f"Using default setup: {name}")
-    return name, s
+    return name, setups[name]
 
 def run_simulation_and_plot(name, setup):
     print(f"Using setup: {name}")
-    sim = Simulation(setup, SIZE, True)
-    for step in range(INIT_STEPS):
+    # Plots of an unchanged setup and run come straight from the cache.
+    cache = ResultCache(CACHE_DIR) if CACHE_DIR else None
+    key = ResultCache.key(script="graph", setup=setup, size=SIZE, steps=STEPS, init_steps=INIT_STEPS,
+                          seed=SEED, engine=ENGINE_VERSION)
+    outputs = {"stacked.png": f"plots/{name}.png", "spacetime.png": f"plots/{name}_spacetime.png"}
+    if cache is not None and cache.get(key) is not None:
+        for cached, target in outputs.items():
+            if cache.file(key, cached):
+                shutil.copyfile(cache.file(key, cached), target)
+                print(f"Plot restored from cache to {target}")
+        return
+
+    sim = Simulation(setup, SIZE, True, seed=SEED)
+    checkpoint = f"{CHECKPOINT_DIR}/{name}.npz" if CHECKPOINT_DIR else None
+    if checkpoint and os.path.exists(checkpoint):
+        sim.load_checkpoint(checkpoint)
+        print(f"Resuming from {checkpoint} at step {len(sim.history)}")
+    else:
+        for step in range(INIT_STEPS):
+            sim.step()
+        sim.clear_history()
+        # 1D runs also keep every row, compressed, for a space-time plot.
+        if setup.n == 1:
+            sim.record_frames()
+    if checkpoint:
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        sim.auto_checkpoint(checkpoint, every=CHECKPOINT_STEPS)
+
+    recorder = TrajectoryRecorder(sim, f"{TRAJECTORY_DIR}/{name}") if TRAJECTORY_DIR else None
+    # Deterministic runs stop once the grid repeats; the rest of the run is that cycle over again.
+    cycle = sim.detect_cycles() if sim.deterministic else None
+    for step in range(STEPS - len(sim.history)):
         sim.step()
-    sim.clear_history()
-
-    for step in range(STEPS):
-        sim.step()
-
-    history = np.array(sim.history)
+        if cycle is not None and cycle.period is not None:
+            break
+    if recorder is not None:
+        recorder.close()
+
+    history = sim.history
+    frames = sim.frames
+    rows = frames.window(0, len(frames)) if frames is not None else None
+    if cycle is not None and cycle.period is not None and len(history) < STEPS:
+        print(f"Cycle of period {cycle.period} entered after {cycle.transient} steps, "
+              f"extrapolating the last {STEPS - len(history)} steps")
+        history = cycle.extrapolate(history, STEPS)
+        if rows is not None:
+            rows = cycle.extrapolate(rows, STEPS + 1)
+    # matplotlib is only loaded once there is something to plot.
+    import matplotlib.pyplot as plt
     n_states = history.shape[1]
     state_labels = setup.names
 
@@ -91,6 +135,30 @@ def run_simulation_and_plot(name, setup):
     print(f"Stacked plot saved to {SAVE_FILENAME}")
     # plt.show()
 
+    if frames is not None:
+        plot_spacetime(name, rows, frames, colors)
+
+    if cache is not None:
+        if rows is None:
+            cache.put(key, {"history": history}, {"stacked.png": outputs["stacked.png"]})
+        else:
+            cache.put(key, {"history": history, "rows": rows}, outputs)
+
+def plot_spacetime(name, rows, frames, colors):
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import ListedColormap
+    plt.figure(figsize=(6, 10))
+    plt.imshow(rows, aspect="auto", interpolation="nearest",
+               cmap=ListedColormap(colors), vmin=0, vmax=len(colors) - 1)
+    plt.title(f"Space-time - setup: {name}")
+    plt.xlabel("Cell")
+    plt.ylabel("Step")
+    plt.tight_layout()
+
+    SAVE_FILENAME = f"plots/{name}_spacetime.png"
+    plt.savefig(SAVE_FILENAME)
+    print(f"Space-time plot saved to {SAVE_FILENAME} ({len(rows)} rows, compressed {frames.compression_ratio:.1f}x)")
+
 def normalize_color(col):
     if col is None:
         return None
@@ -101,6 +169,14 @@ def normalize_color(col):
 INIT_STEPS = 25
 SIZE = 30
 STEPS = 2000
+SEED = 0
+# Directory of cached results and plots, or None to always recompute.
+CACHE_DIR = "cache"
+# Directory for full-grid trajectories (one subdirectory per setup), or None to keep only the counts.
+TRAJECTORY_DIR = None
+# Directory for checkpoints (one file per setup) that an interrupted run resumes from, or None.
+CHECKPOINT_DIR = None
+CHECKPOINT_STEPS = 100
 
 selected_name, selected_setup = pick_setup(setups.setups)
 if selected_name == "ALL":
@@ -0,0 +1,259 @@
+import numpy as np
+
+class Node:
+    # Quadtree node of level k covering 2**k x 2**k cells; a, b, c, d are the nw, ne, sw, se quadrants.
+    __slots__ = ("k", "a", "b", "c", "d", "n")
+
+    def __init__(self, k, a, b, c, d, n):
+        self.k = k
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        self.n = n
+
+# Below this many cells a node is built from a dense bitmap, above it by splitting the cell list.
+DENSE_BUILD = 1 << 12
+
+class HashLifeEngine:
+    # Hashlife for two-state birth/survival rules in 2D. Unlike the dense engines the universe is
+    # unbounded: sim.grid is the window [0, rows) x [0, cols) of an infinite plane, and patterns
+    # that leave it keep evolving outside. Editing the window replaces only what is inside it.
+    def __init__(self, sim, birth, survival, step_log2=0, max_nodes=1 << 22):
+        if 0 in birth:
+            raise ValueError("hashlife needs a rule without birth on 0 neighbours")
+        if step_log2 < 0:
+            raise ValueError("step_log2 must be at least 0")
+        self.sim = sim
+        self.birth = set(birth)
+        self.survival = set(survival)
+        # Each step advances 2**step_log2 generations.
+        self.step_log2 = step_log2
+        # Once the node cache grows past max_nodes everything not reachable from the root is dropped.
+        self.max_nodes = max_nodes
+        self.off = Node(0, None, None, None, None, 0)
+        self.on = Node(0, None, None, None, None, 1)
+        self._clear()
+        self.root = self.zero(3)
+        self.origin = (0, 0)
+        self.shape = (0, 0)
+
+    @property
+    def generations_per_step(self):
+        return 1 << self.step_log2
+
+    def _clear(self):
+        self.nodes = {}
+        self.results = {}
+        self.zeros = [self.off]
+
+    def join(self, a, b, c, d):
+        key = (a, b, c, d)
+        node = self.nodes.get(key)
+        if node is None:
+            node = Node(a.k + 1, a, b, c, d, a.n + b.n + c.n + d.n)
+            self.nodes[key] = node
+        return node
+
+    def zero(self, k):
+        while len(self.zeros) <= k:
+            z = self.zeros[-1]
+            self.zeros.append(self.join(z, z, z, z))
+        return self.zeros[k]
+
+    def centre(self, m):
+        z = self.zero(m.k - 1)
+        return self.join(self.join(z, z, z, m.a), self.join(z, z, m.b, z),
+                         self.join(z, m.c, z, z), self.join(m.d, z, z, z))
+
+    def inner(self, m):
+        return self.join(m.a.d, m.b.c, m.c.b, m.d.a)
+
+    def _base(self, m):
+        # Level 2 node: one generation of its centre 2x2 computed cell by cell.
+        cells = [[m.a.a, m.a.b, m.b.a, m.b.b],
+                 [m.a.c, m.a.d, m.b.c, m.b.d],
+                 [m.c.a, m.c.b, m.d.a, m.d.b],
+                 [m.c.c, m.c.d, m.d.c, m.d.d]]
+        out = []
+        for r in (1, 2):
+            for c in (1, 2):
+                total = sum(cells[y][x].n for y in (r - 1, r, r + 1) for x in (c - 1, c, c + 1)) - cells[r][c].n
+                alive = total in self.survival if cells[r][c].n else total in self.birth
+                out.append(self.on if alive else self.off)
+        return self.join(*out)
+
+    def successor(self, m, j):
+        # Centre half of m advanced by 2**j generations, j <= m.k - 2.
+        j = min(j, m.k - 2)
+        key = (m, j)
+        res = self.results.get(key)
+        if res is not None:
+            return res
+        if m.n == 0:
+            res = m.a
+        elif m.k == 2:
+            res = self._base(m)
+        else:
+            a, b, c, d = m.a, m.b, m.c, m.d
+            c1 = self.successor(a, j)
+            c2 = self.successor(self.join(a.b, b.a, a.d, b.c), j)
+            c3 = self.successor(b, j)
+            c4 = self.successor(self.join(a.c, a.d, c.a, c.b), j)
+            c5 = self.successor(self.join(a.d, b.c, c.b, d.a), j)
+            c6 = self.successor(self.join(b.c, b.d, d.a, d.b), j)
+            c7 = self.successor(c, j)
+            c8 = self.successor(self.join(c.b, d.a, c.d, d.c), j)
+            c9 = self.successor(d, j)
+            if j < m.k - 2:
+                res = self.join(self.join(c1.d, c2.c, c4.b, c5.a), self.join(c2.d, c3.c, c5.b, c6.a),
+                                self.join(c4.d, c5.c, c7.b, c8.a), self.join(c5.d, c6.c, c8.b, c9.a))
+            else:
+                res = self.join(self.successor(self.join(c1, c2, c4, c5), j),
+                                self.successor(self.join(c2, c3, c5, c6), j),
+                                self.successor(self.join(c4, c5, c7, c8), j),
+                                self.successor(self.join(c5, c6, c8, c9), j))
+        self.results[key] = res
+        return res
+
+    def _jump(self, j):
+        node, (r0, c0) = self.root, self.origin
+        # Pad until the pattern sits in the centre half with room to grow by 2**j on every side.
+        while node.k < j + 2 or self.inner(node).n != node.n:
+            shift = 1 << (node.k - 1)
+            node, r0, c0 = self.centre(node), r0 - shift, c0 - shift
+        shift = 1 << (node.k - 1)
+        node, r0, c0 = self.centre(node), r0 - shift, c0 - shift
+        shift = 1 << (node.k - 2)
+        self.root, self.origin = self.successor(node, j), (r0 + shift, c0 + shift)
+
+    def _crop(self):
+        node, (r0, c0) = self.root, self.origin
+        while node.k > 3 and self.inner(node).n == node.n:
+            shift = 1 << (node.k - 2)
+            node, r0, c0 = self.inner(node), r0 + shift, c0 + shift
+        self.root, self.origin = node, (r0, c0)
+
+    def collect(self):
+        # Rebuild the caches with only the nodes reachable from the current root.
+        old = self.root
+        self._clear()
+        memo = {}
+        def rebuild(m):
+            if m.k == 0:
+                return m
+            res = memo.get(id(m))
+            if res is None:
+                res = self.join(rebuild(m.a), rebuild(m.b), rebuild(m.c), rebuild(m.d))
+                memo[id(m)] = res
+            return res
+        self.root = rebuild(old)
+
+    def advance(self, generations):
+        j = 0
+        while generations:
+            if generations & 1:
+                self._jump(j)
+                self._crop()
+                if len(self.nodes) > self.max_nodes:
+                    self.collect()
+            generations >>= 1
+            j += 1
+
+    def step(self):
+        self.advance(self.generations_per_step)
+
+    @property
+    def population(self):
+        return self.root.n
+
+    def _build(self, cells, k):
+        if not cells.any():
+            return self.zero(k)
+        if k == 0:
+            return self.on
+        h = 1 << (k - 1)
+        return self.join(self._build(cells[:h, :h], k - 1), self._build(cells[:h, h:], k - 1),
+                         self._build(cells[h:, :h], k - 1), self._build(cells[h:, h:], k - 1))
+
+    def _build_cells(self, cells, k):
+        # Node of level k holding the given (row, col) cells, relative to its corner.
+        if len(cells) == 0:
+            return self.zero(k)
+        if 1 << (2 * k) <= DENSE_BUILD:
+            grid = np.zeros((1 << k, 1 << k), dtype=bool)
+            grid[tuple(cells.T)] = True
+            return self._build(grid, k)
+        h = 1 << (k - 1)
+        top, left = cells[:, 0] < h, cells[:, 1] < h
+        return self.join(self._build_cells(cells[top & left], k - 1),
+                         self._build_cells(cells[top & ~left] - (0, h), k - 1),
+                         self._build_cells(cells[~top & left] - (h, 0), k - 1),
+                         self._build_cells(cells[~top & ~left] - (h, h), k - 1))
+
+    def load(self, grid):
+        # The window's live cells replace those inside it; the rest of the universe is kept.
+        cells = self.live_cells()
+        inside = np.all((cells >= 0) & (cells < grid.shape), axis=1)
+        self.load_cells(np.concatenate([cells[~inside], np.argwhere(grid == 1)]), grid.shape)
+
+    def load_cells(self, cells, shape):
+        # Universe holding exactly the given live (row, col) cells, which may lie outside the window.
+        # Nodes are canonical, so the memoised results stay valid and are kept.
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        self.shape = tuple(shape)
+        lo = np.minimum(cells.min(axis=0), 0) if len(cells) else np.zeros(2, dtype=np.int64)
+        hi = np.maximum(cells.max(axis=0) + 1, shape) if len(cells) else np.array(shape)
+        k = max(3, int(np.ceil(np.log2(max(hi - lo)))))
+        self.root = self._build_cells(cells - lo, k)
+        self.origin = tuple(int(v) for v in lo)
+
+    def _visit(self, m, r, c, top, left, bottom, right, leaf):
+        # Calls leaf(row, col) for every live cell of m (placed at r, c) inside [top, bottom) x [left, right).
+        size = 1 << m.k
+        if m.n == 0 or r >= bottom or c >= right or r + size <= top or c + size <= left:
+            return
+        if m.k == 0:
+            leaf(r, c)
+            return
+        half = size >> 1
+        self._visit(m.a, r, c, top, left, bottom, right, leaf)
+        self._visit(m.b, r, c + half, top, left, bottom, right, leaf)
+        self._visit(m.c, r + half, c, top, left, bottom, right, leaf)
+        self._visit(m.d, r + half, c + half, top, left, bottom, right, leaf)
+
+    def window(self, top, left, rows, cols):
+        out = np.zeros((rows, cols), dtype=np.uint8)
+        def leaf(r, c):
+            out[r - top, c - left] = 1
+        self._visit(self.root, *self.origin, top, left, top + rows, left + cols, leaf)
+        return out
+
+    def live_cells(self):
+        # (row, col) of every live cell in the universe, without rasterising the empty space.
+        cells = []
+        self._visit(self.root, *self.origin, -np.inf, -np.inf, np.inf, np.inf, lambda r, c: cells.append((r, c)))
+        return np.array(cells, dtype=np.int64).reshape(-1, 2)
+
+    def bounding_box(self):
+        cells = self.live_cells()
+        if len(cells) == 0:
+            return None
+        return tuple(int(v) for v in cells.min(axis=0)), tuple(int(v) + 1 for v in cells.max(axis=0))
+
+    def _count(self, m, r, c, top, left, bottom, right):
+        size = 1 << m.k
+        if m.n == 0 or r >= bottom or c >= right or r + size <= top or c + size <= left:
+            return 0
+        if r >= top and c >= left and r + size <= bottom and c + size <= right:
+            return m.n
+        half = size >> 1
+        return (self._count(m.a, r, c, top, left, bottom, right) + self._count(m.b, r, c + half, top, left, bottom, right)
+                + self._count(m.c, r + half, c, top, left, bottom, right) + self._count(m.d, r + half, c + half, top, left, bottom, right))
+
+    def store(self, grid):
+        grid[...] = self.window(0, 0, *self.shape)
+
+    def state_counts(self):
+        alive = self._count(self.root, *self.origin, 0, 0, *self.shape)
+        return [self.shape[0] * self.shape[1] - alive, alive]
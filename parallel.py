@@ -0,0 +1,218 @@
+import os
+import weakref
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor
+from stencil import SlabKernel, count_states, update_halo
+
+# Control words shared with the workers: what to do next, which buffer is the front one and the generation.
+STEP, EXIT = 0, 1
+# Cache a band's working set is sized for when the L2 size cannot be read.
+CACHE_BYTES = 1 << 20
+
+def cache_size():
+    try:
+        with open("/sys/devices/system/cpu/cpu0/cache/index2/size") as f:
+            text = f.read().strip()
+        units = {"K": 1 << 10, "M": 1 << 20}
+        return int(text[:-1]) * units[text[-1]] if text[-1] in units else int(text)
+    except (OSError, ValueError, KeyError):
+        return CACHE_BYTES
+
+def band_rows(shape, cell_bytes, workers, cache=None):
+    # Rows per band: few enough for a band's working set to stay in cache, but at least one band per worker.
+    row = cell_bytes * int(np.prod(shape[1:]))
+    rows = max(1, (cache or cache_size()) // max(1, row))
+    return int(min(rows, -(-shape[0] // workers)))
+
+class BandRandom:
+    # Uniform draws for one band. In counter mode they are exactly the whole-grid draws for these
+    # cells; in generator mode the band has a stream of its own.
+    def __init__(self, random, start, seed):
+        self.random = random
+        self.start = start
+        self.generator = np.random.default_rng(seed)
+        self.step = 0
+
+    def __call__(self, shape, out=None):
+        if self.random.mode == "counter":
+            return self.random.uniform(shape, self.step, self.start, out)
+        if out is None:
+            return self.generator.random(shape)
+        return self.generator.random(out=out)
+
+def band_seeds(random, count):
+    # Kept apart from the simulation's own streams, which are spawned from the bare seed.
+    return np.random.SeedSequence([random.seed, 1]).spawn(count)
+
+def _buffers(shm, padded, dtype):
+    size = int(np.prod(padded)) * np.dtype(dtype).itemsize
+    return [np.ndarray(padded, dtype=dtype, buffer=shm.buf, offset=i * size) for i in range(2)]
+
+def _worker(name, padded, dtype, start, stop, kernel_args, random, barrier, control):
+    # Owns rows [start, stop) of the interior; reads rows [start, stop + 2) of the padded front buffer.
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        buffers = _buffers(shm, padded, dtype)
+        kernel = SlabKernel(*kernel_args, (stop - start + 2,) + padded[1:], dtype)
+        interior = (slice(1, -1),) * (len(padded) - 1)
+        while True:
+            barrier.wait()
+            if control[0] == EXIT:
+                break
+            front = control[1]
+            random.step = control[2]
+            try:
+                kernel.run(buffers[front][start:stop + 2], buffers[front ^ 1][(slice(start + 1, stop + 1),) + interior], random)
+            except BaseException:
+                # Wakes the parent with BrokenBarrierError instead of leaving it waiting forever.
+                barrier.abort()
+                raise
+            barrier.wait()
+    finally:
+        del buffers
+        shm.close()
+
+def _shutdown(processes, barrier, control, shm):
+    if processes:
+        control[0] = EXIT
+        try:
+            barrier.wait(timeout=5)
+        except Exception:
+            pass
+        for p in processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+    shm.close()
+    shm.unlink()
+
+class ParallelEngine:
+    # Dense stepping split into slabs along the first axis, one worker process each. Both padded
+    # buffers live in shared memory, so a generation is: the parent refreshes the halo, every worker
+    # writes its slab of the back buffer from the front one, and a barrier later the buffers swap.
+    # Nothing but the control words crosses process boundaries. Deterministic rules, and probabilistic
+    # ones with rng="counter", give the same grids as the dense path.
+    generations_per_step = 1
+
+    def __init__(self, sim, workers=None):
+        if sim.table is None:
+            raise ValueError("parallel engine needs rules that compile_rules can compile")
+        self.sim = sim
+        self.workers = workers or os.cpu_count() or 1
+        self.shape = None
+        self._finalizer = None
+
+    def load(self, grid):
+        if grid.shape != self.shape:
+            self.close()
+            self._start(grid.shape, grid.dtype)
+        self.buffers[self.front][self.interior] = grid
+
+    def _start(self, shape, dtype):
+        sim = self.sim
+        self.shape = shape
+        self.padded = tuple(d + 2 for d in shape)
+        self.interior = (slice(1, -1),) * len(shape)
+        nbytes = 2 * int(np.prod(self.padded)) * np.dtype(dtype).itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.buffers = _buffers(self.shm, self.padded, dtype)
+        for buffer in self.buffers:
+            buffer.fill(sim.state_count)
+        self.front = 0
+        ctx = mp.get_context()
+        count = max(1, min(self.workers, shape[0]))
+        self.barrier = ctx.Barrier(count + 1)
+        self.control = ctx.RawArray('q', 3)
+        bounds = np.linspace(0, shape[0], count + 1).astype(int)
+        kernel_args = (sim.table, sim.planes, sim.offsets, sim._separable, sim.count_dtype)
+        seeds = band_seeds(sim.random, count)
+        row = int(np.prod(shape[1:]))
+        self.processes = []
+        for i in range(count):
+            p = ctx.Process(target=_worker, daemon=True,
+                            args=(self.shm.name, self.padded, dtype, int(bounds[i]), int(bounds[i + 1]),
+                                  kernel_args, BandRandom(sim.random, int(bounds[i]) * row, seeds[i]), self.barrier, self.control))
+            p.start()
+            self.processes.append(p)
+        self._finalizer = weakref.finalize(self, _shutdown, self.processes, self.barrier, self.control, self.shm)
+
+    def close(self):
+        if self._finalizer is not None:
+            self.buffers = None
+            self._finalizer()
+            self._finalizer = None
+            self.shape = None
+
+    def store(self, grid):
+        grid[...] = self.buffers[self.front][self.interior]
+
+    def state_counts(self):
+        return count_states(self.buffers[self.front][self.interior], self.sim.state_count).tolist()
+
+    def step(self):
+        update_halo(self.buffers[self.front], self.sim.wrap, self.sim.state_count)
+        self.control[0] = STEP
+        self.control[1] = self.front
+        self.control[2] = self.sim.generation
+        self.barrier.wait()
+        self.barrier.wait()
+        self.front ^= 1
+
+class ThreadEngine:
+    # Dense stepping split into bands of rows run on a thread pool. The NumPy calls in each band
+    # release the GIL, so bands proceed in parallel without process start-up or shared memory.
+    # Band height comes from band_rows() unless given.
+    generations_per_step = 1
+
+    def __init__(self, sim, workers=None, band_rows=None):
+        if sim.table is None:
+            raise ValueError("thread engine needs rules that compile_rules can compile")
+        self.sim = sim
+        self.workers = workers or os.cpu_count() or 1
+        self.band_rows = band_rows
+        self.shape = None
+        self.pool = None
+
+    def load(self, grid):
+        if grid.shape != self.shape:
+            self._start(grid.shape, grid.dtype)
+        self.buffers[self.front][self.interior] = grid
+
+    def _start(self, shape, dtype):
+        sim = self.sim
+        self.shape = shape
+        padded = tuple(d + 2 for d in shape)
+        self.interior = (slice(1, -1),) * len(shape)
+        self.buffers = [np.full(padded, sim.state_count, dtype=dtype) for _ in range(2)]
+        self.front = 0
+        rows = self.band_rows or band_rows(shape, SlabKernel.cell_bytes(sim), self.workers)
+        bounds = list(range(0, shape[0], rows)) + [shape[0]]
+        kernel_args = (sim.table, sim.planes, sim.offsets, sim._separable, sim.count_dtype)
+        seeds = band_seeds(sim.random, len(bounds) - 1)
+        row = int(np.prod(shape[1:]))
+        self.bands = [(a, b, SlabKernel(*kernel_args, (b - a + 2,) + padded[1:], dtype), BandRandom(sim.random, a * row, seed))
+                      for a, b, seed in zip(bounds, bounds[1:], seeds)]
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(self.workers)
+            weakref.finalize(self, self.pool.shutdown)
+
+    def store(self, grid):
+        grid[...] = self.buffers[self.front][self.interior]
+
+    def state_counts(self):
+        return count_states(self.buffers[self.front][self.interior], self.sim.state_count).tolist()
+
+    def _run(self, band):
+        start, stop, kernel, random = band
+        front, back = self.buffers[self.front], self.buffers[self.front ^ 1]
+        kernel.run(front[start:stop + 2], back[(slice(start + 1, stop + 1),) + self.interior[1:]], random)
+
+    def step(self):
+        update_halo(self.buffers[self.front], self.sim.wrap, self.sim.state_count)
+        for band in self.bands:
+            band[3].step = self.sim.generation
+        # list() waits for every band and re-raises the first error.
+        list(self.pool.map(self._run, self.bands))
+        self.front ^= 1
@@ -0,0 +1,125 @@
+import os
+import json
+import queue
+import threading
+import numpy as np
+
+# Frames per chunk file; a reader maps one chunk at a time.
+CHUNK_FRAMES = 256
+# Frames waiting for the writer thread at most; capture() blocks once this many are queued.
+QUEUE_FRAMES = 16
+
+def _chunk_path(path, index):
+    return os.path.join(path, f"chunk_{index:06d}.npy")
+
+def _write_meta(path, meta):
+    # Written to a temporary file and renamed, so readers never see half an index.
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+class TrajectoryRecorder:
+    # Streams grid frames of a Simulation to a directory of fixed-size .npy chunks plus a meta.json
+    # index. Frames are uint8 state indices. The stepping thread only copies the frame (or its
+    # region of interest) into a bounded queue; a background thread writes them into memory-mapped
+    # chunk files. Attaching records the current grid as frame 0, then every stride-th step.
+    def __init__(self, sim, path, stride=1, roi=None, chunk=CHUNK_FRAMES, queue_frames=QUEUE_FRAMES):
+        self.sim = sim
+        self.path = path
+        self.stride = stride
+        self.roi = tuple(roi) if roi is not None else ()
+        self.chunk = chunk
+        frame = sim._dense()[self.roi]
+        per_step = sim.engine.generations_per_step if sim.engine is not None else 1
+        self.meta = {"frame_shape": list(frame.shape), "chunk": chunk, "count": 0, "stride": stride,
+                     "first_generation": sim.generation, "generations_per_frame": stride * per_step,
+                     "roi": [[s.start, s.stop, s.step] for s in self.roi]}
+        os.makedirs(path, exist_ok=True)
+        self.queue = queue.Queue(maxsize=queue_frames)
+        self.error = None
+        self.calls = 0
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+        sim.recorder = self
+        self._put(frame)
+
+    def _put(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(np.array(frame, dtype=np.uint8))
+
+    def capture(self, grid):
+        # Called by the simulation after every step.
+        self.calls += 1
+        if self.calls % self.stride == 0:
+            self._put(grid[self.roi])
+
+    def _write(self):
+        store = None
+        try:
+            while True:
+                frame = self.queue.get()
+                if frame is None:
+                    break
+                slot = self.meta["count"] % self.chunk
+                if slot == 0:
+                    if store is not None:
+                        store.flush()
+                    store = np.lib.format.open_memmap(_chunk_path(self.path, self.meta["count"] // self.chunk), mode="w+",
+                                                      dtype=np.uint8, shape=(self.chunk,) + frame.shape)
+                store[slot] = frame
+                self.meta["count"] += 1
+                if slot == self.chunk - 1:
+                    store.flush()
+                    _write_meta(self.path, self.meta)
+        except BaseException as e:
+            self.error = e
+            # Keep draining so capture() never blocks on a dead writer.
+            while self.queue.get() is not None:
+                pass
+        finally:
+            if store is not None:
+                store.flush()
+                del store
+            _write_meta(self.path, self.meta)
+
+    def close(self):
+        if self.sim.recorder is self:
+            self.sim.recorder = None
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Trajectory:
+    # Read side of a recorder directory: len() frames, trajectory[i] maps just the chunk holding frame i.
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.chunk = self.meta["chunk"]
+        self._chunks = {}
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        number = index // self.chunk
+        if number not in self._chunks:
+            self._chunks[number] = np.load(_chunk_path(self.path, number), mmap_mode="r")
+        return self._chunks[number][index % self.chunk]
+
+    def generation(self, index):
+        return self.meta["first_generation"] + index * self.meta["generations_per_frame"]
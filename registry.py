@@ -0,0 +1,47 @@
+import re
+from collections.abc import Mapping
+
+class SetupRegistry(Mapping):
+    # Name -> SimulationSetup, where each setup is built by its zero-argument factory on first lookup
+    # and then kept. Iterating lists only the registered names; a name that is not registered is
+    # matched against the (regex, factory) patterns instead, e.g. "B3/S23" or "Rule 110", whose
+    # factory gets the regex groups as arguments.
+    def __init__(self, factories, patterns=()):
+        self.factories = dict(factories)
+        self.patterns = [(re.compile(p, re.IGNORECASE), make) for p, make in patterns]
+        self._built = {}
+
+    def _factory(self, name):
+        if name in self.factories:
+            return self.factories[name]
+        for pattern, make in self.patterns:
+            match = pattern.fullmatch(name)
+            if match:
+                return lambda: make(*match.groups())
+        return None
+
+    def __getitem__(self, name):
+        if name not in self._built:
+            factory = self._factory(name)
+            if factory is None:
+                raise KeyError(name)
+            self._built[name] = factory()
+        return self._built[name]
+
+    def __contains__(self, name):
+        return isinstance(name, str) and self._factory(name) is not None
+
+    def __iter__(self):
+        return iter(self.factories)
+
+    def __len__(self):
+        return len(self.factories)
+
+    def register(self, name, factory):
+        self.factories[name] = factory
+        self._built.pop(name, None)
+
+    def __or__(self, other):
+        merged = SetupRegistry({**self.factories, **other.factories})
+        merged.patterns = self.patterns + other.patterns
+        return merged
@@ -0,0 +1,59 @@
+import numpy as np
+
+MODES = ("generator", "counter")
+# Counter-mode draws are made this many cells at a time, which bounds their raw uint64 scratch.
+COUNTER_CHUNK = 1 << 16
+
+class GridRandom:
+    # Uniform [0, 1) draws for whole grids, one array per generation.
+    # "generator" draws from seeded numpy Generators (one per replica) in step order.
+    # "counter" derives every number from (seed, step, replica, cell index) with Philox, so a cell
+    # gets the same draw however the grid is split into bands, slabs or replica batches.
+    def __init__(self, seed=None, mode="generator", replicas=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown rng mode: {mode}")
+        if seed is None:
+            # Drawn from the global RNG, so np.random.seed still pins unseeded runs.
+            seed = int(np.random.randint(1 << 31))
+        self.seed = seed
+        self.mode = mode
+        self.replicas = replicas
+        self.key = np.random.SeedSequence(seed).generate_state(2, np.uint64)
+        self.generators = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(replicas or 1)]
+
+    def _counter(self, step, replica, start, out):
+        # Philox turns one 4-word counter into 4 outputs; cell i is lane i % 4 of counter block i // 4.
+        for first in range(0, len(out), COUNTER_CHUNK):
+            cell = start + first
+            part = out[first:first + COUNTER_CHUNK]
+            bits = np.random.Philox(key=self.key, counter=[cell // 4, 0, step, replica])
+            raw = bits.random_raw(cell % 4 + len(part))[cell % 4:]
+            raw >>= np.uint64(11)
+            np.multiply(raw, 1.0 / (1 << 53), out=part)
+
+    def uniform(self, shape, step, start=0, out=None):
+        # Draws for `shape` (with the replica axis first when there are replicas), written into out
+        # when given so a step allocates nothing; start is the flat index of the first cell when
+        # shape is one band of a larger grid.
+        if out is None:
+            out = np.empty(shape)
+        if self.mode == "counter":
+            parts = out.reshape(shape[0], -1) if self.replicas else out.reshape(1, -1)
+            for replica, part in enumerate(parts):
+                self._counter(step, replica, start, part)
+            return out
+        for rng, part in zip(self.generators, out if self.replicas else [out]):
+            rng.random(out=part)
+        return out
+
+    @property
+    def state(self):
+        # Everything needed to continue the same random sequence, as plain Python data.
+        return {"seed": self.seed, "mode": self.mode, "generators": [rng.bit_generator.state for rng in self.generators]}
+
+    @state.setter
+    def state(self, value):
+        if value["seed"] != self.seed or value["mode"] != self.mode:
+            self.__init__(value["seed"], value["mode"], self.replicas)
+        for rng, state in zip(self.generators, value["generators"]):
+            rng.bit_generator.state = state
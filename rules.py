@@ -1,17 +1,49 @@
+import json
+import hashlib
 from abc import ABC, abstractmethod
 import numpy as np
 
+# Used by rules checked outside a Simulation, which otherwise supplies its seeded sim.rng.
+_fallback_rng = np.random.default_rng()
+
+def _rng(sim):
+    return getattr(sim, "rng", None) or _fallback_rng
+
+def canonical(value):
+    # Order-stable plain data for hashing: dict items sorted by key, sets sorted, numpy values as
+    # Python ones, and anything with a canonical() method (rules, setups) through it.
+    if hasattr(value, "canonical") and not isinstance(value, type):
+        return value.canonical()
+    if isinstance(value, dict):
+        return [[canonical(k), canonical(v)] for k, v in sorted(value.items(), key=lambda item: repr(item[0]))]
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(canonical(v) for v in value)
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+def canonical_hash(value):
+    # Hex SHA-256 of canonical(value): stable across processes and runs, unlike hash(), so equal
+    # setups, rules or parameters built separately match.
+    return hashlib.sha256(json.dumps(canonical(value)).encode()).hexdigest()
+
 class IRule(ABC):
     @abstractmethod
     def check(self, curr, neighbor, sim):
         pass
 
+    def canonical(self):
+        # Class name plus attributes; subclasses with derived attributes leave them out.
+        return [type(self).__name__, canonical(vars(self))]
+
 class RandomRule(IRule):
     def __init__(self):
         pass
 
     def check(self, curr, neighbor, sim):
-        return np.random.randint(neighbor.state_count)
+        return _rng(sim).integers(neighbor.state_count)
 
 class ClassicRule(IRule):
     def __init__(self, start, end, positivity, values):
@@ -40,7 +72,7 @@ class WeightedRandomRule(IRule):
     def check(self, curr, neighbor, sim):
         counts = np.array(neighbor.neighbors)            
         probabilities = counts / counts.sum()
-        return np.random.choice(np.arange(neighbor.state_count), p=probabilities)
+        return _rng(sim).choice(neighbor.state_count, p=probabilities)
 
 class MajorityRule(IRule):
     def __init__(self):
@@ -80,7 +112,7 @@ class ProbabilisticRule(IRule):
                 if counts[state] in valid_counts:
                     return -1
 
-        if np.random.rand() < self.probability:
+        if _rng(sim).random() < self.probability:
             return self.end
         else:
             return self.start
@@ -92,21 +124,27 @@ class SierpinskiRule(IRule):
 
     def check(self, curr, neighbor, sim):
         i = neighbor.location[0]
-        left = 1 if i > 0 and sim.grid[i - 1] == sim.states[1] else 0
-        right = 1 if i < sim.size - 1 and sim.grid[i + 1] == sim.states[1] else 0
+        wrap = getattr(sim, "wrap", False)
+        left = 1 if (i > 0 or wrap) and sim.grid[i - 1] == sim.states[1] else 0
+        right = 1 if (i < sim.size - 1 or wrap) and sim.grid[(i + 1) % sim.size] == sim.states[1] else 0
 
         return left ^ right
 
 class RuleN(IRule):
     def __init__(self, rule_number: int):
         assert 0 <= rule_number <= 255, "Rule number must be 0-255"
+        self.rule_number = rule_number
         self.rule_bin = f"{rule_number:08b}"
 
+    def canonical(self):
+        return ["RuleN", self.rule_number]
+
     def check(self, curr, neighbor, sim):
         i = neighbor.location[0]
-        left = 1 if i > 0 and sim.grid[i - 1] == sim.states[1] else 0
+        wrap = getattr(sim, "wrap", False)
+        left = 1 if (i > 0 or wrap) and sim.grid[i - 1] == sim.states[1] else 0
         center = 1 if sim.grid[i] == sim.states[1] else 0
-        right = 1 if i < sim.size - 1 and sim.grid[i + 1] == sim.states[1] else 0
+        right = 1 if (i < sim.size - 1 or wrap) and sim.grid[(i + 1) % sim.size] == sim.states[1] else 0
         neighborhood = (left << 2) | (center << 1) | right
         output = int(self.rule_bin[7 - neighborhood])
         return output
@@ -119,6 +157,10 @@ class Rules:
     def add(self, rule):
         self.rules.append(rule)
 
+    def canonical(self):
+        # In order: the first matching rule wins.
+        return [rule.canonical() for rule in self.rules]
+
     def check(self, state, neighbor, sim):
         for rule in self.rules:
             res = rule.check(state, neighbor, sim)
@@ -4,4 +4,5 @@ import setups_1d
 import setups_2d
 import setups_3d
 
+# Lazy: a setup is built when it is first looked up, see registry.SetupRegistry.
 setups = setups_1d.setups | setups_2d.setups | setups_3d.setups
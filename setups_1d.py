@@ -1,28 +1,31 @@
 import numpy as np
 from simulation import SimulationSetup
 from rules import *
+from registry import SetupRegistry
 
-one_d_rules = Rules()
-one_d_rules.add(RandomRule())
-one_d_setup = SimulationSetup(
-    n=1,
-    state_count=2,
-    rules=one_d_rules,
-    colors=[(0, 0, 0), (255, 255, 255)],
-    offsets=None,
-    names=["Dead", "Alive"]
-)
+def one_d_setup():
+    one_d_rules = Rules()
+    one_d_rules.add(RandomRule())
+    return SimulationSetup(
+        n=1,
+        state_count=2,
+        rules=one_d_rules,
+        colors=[(0, 0, 0), (255, 255, 255)],
+        offsets=None,
+        names=["Dead", "Alive"]
+    )
 
-sierp_rules = Rules()
-sierp_rules.add(SierpinskiRule())
-sierp_setup = SimulationSetup(
-    n=1,
-    state_count=2,
-    rules=sierp_rules,
-    colors=[(0, 0, 0), (255, 255, 255)],
-    offsets=None,
-    names=["Dead", "Alive"]
-)
+def sierp_setup():
+    sierp_rules = Rules()
+    sierp_rules.add(SierpinskiRule())
+    return SimulationSetup(
+        n=1,
+        state_count=2,
+        rules=sierp_rules,
+        colors=[(0, 0, 0), (255, 255, 255)],
+        offsets=None,
+        names=["Dead", "Alive"]
+    )
 
 def setup_from_1d(rule_number: int, alive_color=(255, 255, 255), dead_color=(0, 0, 0)):
     rules = Rules()
@@ -39,11 +42,15 @@ def setup_from_1d(rule_number: int, alive_color=(255, 255, 255), dead_color=(0,
     return setup
 
 
-setups = {
+# Built on first lookup; "Rule 110" style names work without being listed.
+setups = SetupRegistry({
     "1D Elementary" : one_d_setup,
     "Sierpinski Triangle" : sierp_setup,
-    "(Rule90)" : setup_from_1d(90),
-    "(Rule30)" : setup_from_1d(30),
-    "(Rule110)" : setup_from_1d(110),
-    "(Rule150)" : setup_from_1d(150),
-}
+    "(Rule90)" : lambda: setup_from_1d(90),
+    "(Rule30)" : lambda: setup_from_1d(30),
+    "(Rule110)" : lambda: setup_from_1d(110),
+    "(Rule150)" : lambda: setup_from_1d(150),
+}, patterns=[
+    # Elementary rules are numbered 0-255.
+    (r"\(?Rule\s*(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\)?", lambda number: setup_from_1d(int(number))),
+])
@@ -2,142 +2,155 @@ import numpy as np
 from simulation import SimulationSetup
 from rules import *
 import colorsys
+from registry import SetupRegistry
 
 colors = [(0, 0, 0), (255, 255, 255)]
-game_rules = Rules()
-game_rules.add(ClassicRule(0, 1, True, {1: [3]}))
-game_rules.add(ClassicRule(1, 0, False, {1: [2, 3]}))
-game_setup = SimulationSetup(n=2, state_count=2, rules=game_rules, colors=colors, offsets=None, names = ["Dead", "Alive"])
 
-random_rules = Rules()
-random_rules.add(RandomRule())
-random_colors = [(100, 100, 100), (150, 150, 150), (200, 200, 200)]
-random_setup = SimulationSetup(n=2, state_count=3, rules=random_rules, colors=random_colors, offsets=None, names = ["r1", "r2", "r3"])
+def game_setup():
+    game_rules = Rules()
+    game_rules.add(ClassicRule(0, 1, True, {1: [3]}))
+    game_rules.add(ClassicRule(1, 0, False, {1: [2, 3]}))
+    return SimulationSetup(n=2, state_count=2, rules=game_rules, colors=colors, offsets=None, names = ["Dead", "Alive"])
+
+def random_setup():
+    random_rules = Rules()
+    random_rules.add(RandomRule())
+    random_colors = [(100, 100, 100), (150, 150, 150), (200, 200, 200)]
+    return SimulationSetup(n=2, state_count=3, rules=random_rules, colors=random_colors, offsets=None, names = ["r1", "r2", "r3"])
 
 map_colors = [
     (0, 0, 255),
     (255, 255, 150),
     (0, 200, 0),
 ]
-map_rules = Rules()
-map_rules.add(ClassicRule(
-    start=0,
-    end=1,
-    positivity=True,
-    values={1: [6, 7, 8]}
-))
-map_rules.add(ClassicRule(
-    start=0,
-    end=1,
-    positivity=True,
-    values={2: [5, 6, 7, 8]}
-))
-map_rules.add(ClassicRule(
-    start=1,
-    end=0,
-    positivity=True,
-    values={0: [5, 6, 7, 8]}
-))
-map_rules.add(ClassicRule(
-    start=1,
-    end=2,  
-    positivity=True,
-    values={1: [5, 6, 7, 8]}
-))
-map_rules.add(ClassicRule(
-    start=1,
-    end=2,
-    positivity=True,
-    values={2: [5, 6, 7, 8]}
-))
-map_rules.add(ClassicRule(
-    start=2,
-    end=1,
-    positivity=True,
-    values={0: [3, 4, 5, 6, 7, 8]}
-))
-map_rules.add(ClassicRule(
-    start=2,
-    end=1,
-    positivity=True,
-    values={1: [4, 5, 6, 7, 8]}
-))
-map_setup = SimulationSetup(
-    n=2,
-    state_count=3,
-    rules=map_rules,
-    colors=map_colors,
-    offsets=None,
-    names = ["water", "beach", "land"]
-)
+
+def map_setup():
+    map_rules = Rules()
+    map_rules.add(ClassicRule(
+        start=0,
+        end=1,
+        positivity=True,
+        values={1: [6, 7, 8]}
+    ))
+    map_rules.add(ClassicRule(
+        start=0,
+        end=1,
+        positivity=True,
+        values={2: [5, 6, 7, 8]}
+    ))
+    map_rules.add(ClassicRule(
+        start=1,
+        end=0,
+        positivity=True,
+        values={0: [5, 6, 7, 8]}
+    ))
+    map_rules.add(ClassicRule(
+        start=1,
+        end=2,  
+        positivity=True,
+        values={1: [5, 6, 7, 8]}
+    ))
+    map_rules.add(ClassicRule(
+        start=1,
+        end=2,
+        positivity=True,
+        values={2: [5, 6, 7, 8]}
+    ))
+    map_rules.add(ClassicRule(
+        start=2,
+        end=1,
+        positivity=True,
+        values={0: [3, 4, 5, 6, 7, 8]}
+    ))
+    map_rules.add(ClassicRule(
+        start=2,
+        end=1,
+        positivity=True,
+        values={1: [4, 5, 6, 7, 8]}
+    ))
+    return SimulationSetup(
+        n=2,
+        state_count=3,
+        rules=map_rules,
+        colors=map_colors,
+        offsets=None,
+        names = ["water", "beach", "land"]
+    )
 
 rps_colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
-rps_rules = Rules()
-rps_rules.add(ClassicRule(0, 0, True, {2: [0, 1, 2]}))
-rps_rules.add(ClassicRule(0, 2, True, {1: [0, 1, 2]}))
-rps_rules.add(ClassicRule(1, 1, True, {0: [0, 1, 2]}))
-rps_rules.add(ClassicRule(1, 0, True, {2: [0, 1, 2]}))
-rps_rules.add(ClassicRule(2, 2, True, {1: [0, 1, 2]}))
-rps_rules.add(ClassicRule(2, 1, True, {0: [0, 1, 2]}))
-rps_setup = SimulationSetup(
-    n=2,
-    state_count=3,
-    rules=rps_rules,
-    colors=rps_colors,
-    offsets=None,
-    names = ["rock", "paper", "scissors"]
-)
+
+def rps_setup():
+    rps_rules = Rules()
+    rps_rules.add(ClassicRule(0, 0, True, {2: [0, 1, 2]}))
+    rps_rules.add(ClassicRule(0, 2, True, {1: [0, 1, 2]}))
+    rps_rules.add(ClassicRule(1, 1, True, {0: [0, 1, 2]}))
+    rps_rules.add(ClassicRule(1, 0, True, {2: [0, 1, 2]}))
+    rps_rules.add(ClassicRule(2, 2, True, {1: [0, 1, 2]}))
+    rps_rules.add(ClassicRule(2, 1, True, {0: [0, 1, 2]}))
+    return SimulationSetup(
+        n=2,
+        state_count=3,
+        rules=rps_rules,
+        colors=rps_colors,
+        offsets=None,
+        names = ["rock", "paper", "scissors"]
+    )
 
 duel_colors = [(255, 255, 0), (0, 255, 255)]
-duel_rules = Rules()
-duel_rules.add(WeightedRandomRule())
-duel_setup = SimulationSetup(
-    n=2,
-    state_count=2,
-    rules=duel_rules,
-    colors=duel_colors,
-    offsets=None,
-    names = ["s1", "s2"]
-)
+
+def duel_setup():
+    duel_rules = Rules()
+    duel_rules.add(WeightedRandomRule())
+    return SimulationSetup(
+        n=2,
+        state_count=2,
+        rules=duel_rules,
+        colors=duel_colors,
+        offsets=None,
+        names = ["s1", "s2"]
+    )
 
 pp_colors = [
     (0, 0, 0),
     (0, 200, 0),
     (200, 0, 0),
 ]
-pp_rules = Rules()
-pp_rules.add(ProbabilisticRule(
-    start=0,
-    end=1,
-    probability=0.8,
-    neighbor_counts={1: [2,3,4]}
-))
-pp_rules.add(ProbabilisticRule(
-    start=1,
-    end=2,
-    probability=0.4,
-    neighbor_counts={2: [1,2,3,4,5,6,7,8]}
-))
-pp_rules.add(ProbabilisticRule(
-    start=2,
-    end=0,
-    probability=1.0,
-    neighbor_counts={1: [0]}
-))
-pp_rules.add(ProbabilisticRule(
-    start=2,
-    end=0,
-    probability=0.95,
-    neighbor_counts={2: [4,5,6,7,8,9]}
-))
-pp_setup = SimulationSetup(
-    n=2,
-    state_count=3,
-    rules=pp_rules,
-    colors=pp_colors,
-    offsets=None,
-    names = ["empty", "prey", "predator"]
-)
+
+def prey_predator_setup_factory(prey_birth=0.8, predation=0.4, starvation=1.0, crowding=0.95):
+    # Probabilities of the four transitions; the defaults are the "Prey-Predator" preset.
+    pp_rules = Rules()
+    pp_rules.add(ProbabilisticRule(
+        start=0,
+        end=1,
+        probability=prey_birth,
+        neighbor_counts={1: [2,3,4]}
+    ))
+    pp_rules.add(ProbabilisticRule(
+        start=1,
+        end=2,
+        probability=predation,
+        neighbor_counts={2: [1,2,3,4,5,6,7,8]}
+    ))
+    pp_rules.add(ProbabilisticRule(
+        start=2,
+        end=0,
+        probability=starvation,
+        neighbor_counts={1: [0]}
+    ))
+    pp_rules.add(ProbabilisticRule(
+        start=2,
+        end=0,
+        probability=crowding,
+        neighbor_counts={2: [4,5,6,7,8,9]}
+    ))
+    return SimulationSetup(
+        n=2,
+        state_count=3,
+        rules=pp_rules,
+        colors=pp_colors,
+        offsets=None,
+        names = ["empty", "prey", "predator"]
+    )
 
 # https://en.wikipedia.org/wiki/Cyclic_cellular_automaton
 def cyclic_setup_factory(n: int):
@@ -193,16 +206,21 @@ def setup_from_b_s(rule_string: str, alive_color=(255, 255, 255), dead_color=(0,
     return setup
 
 
-setups = {
+# Built on first lookup; "B3/S23" and "Cyclic 6" style names work without being listed.
+setups = SetupRegistry({
     "Game Of Life": game_setup,
     "Random": random_setup,
     "Map": map_setup,
     "Rock Paper Scissors": rps_setup,
     "Duel" : duel_setup,
-    "Prey-Predator" : pp_setup,
-    "Cyclic (Rainbow) 6" : cyclic_setup_factory(6),
-    "Cyclic (Rainbow) 10" : cyclic_setup_factory(10),
-    "Cyclic (Rainbow) 16" : cyclic_setup_factory(16),
-    "Maze (B3S12345)" : setup_from_b_s("B3/S12345"),
-    "Mazectric (B3S1234)" : setup_from_b_s("B3/S1234"),
-}
+    "Prey-Predator" : prey_predator_setup_factory,
+    "Cyclic (Rainbow) 6" : lambda: cyclic_setup_factory(6),
+    "Cyclic (Rainbow) 10" : lambda: cyclic_setup_factory(10),
+    "Cyclic (Rainbow) 16" : lambda: cyclic_setup_factory(16),
+    "Maze (B3S12345)" : lambda: setup_from_b_s("B3/S12345"),
+    "Mazectric (B3S1234)" : lambda: setup_from_b_s("B3/S1234"),
+}, patterns=[
+    # Neighbour counts run 0-8 and a cycle needs at least two states.
+    (r"(B[0-8]*/S[0-8]*)", setup_from_b_s),
+    (r"Cyclic\s*(?:\(Rainbow\)\s*)?([2-9]|[1-9]\d+)", lambda n: cyclic_setup_factory(int(n))),
+])
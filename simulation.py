@@ -1,6 +1,25 @@
+import os
 import numpy as np
 from dataclasses import dataclass
-from rules import Rules
+from rules import Rules, canonical
+from compiler import compile_rules, birth_survival
+from elementary import elementary_rule_number
+from active import ActiveSet
+from rng import GridRandom
+from framehistory import FrameHistory, KEYFRAME_INTERVAL
+import checkpoint
+from cycles import CycleDetector, CYCLE_WINDOW
+from stencil import SlabKernel, count_states, update_halo
+
+# Rows the history buffer starts with; it doubles whenever it fills up.
+HISTORY_CAPACITY = 256
+
+# Grids at least this large are stepped on a thread pool by engine="auto" when there are several cores.
+THREADS_MIN_CELLS = 1 << 16
+# Tuning options each engine takes through Simulation(engine_options=...).
+ENGINE_OPTIONS = {"hashlife": ("step_log2", "max_nodes"), "parallel": ("workers",), "threads": ("workers", "band_rows")}
+# Part of every cached result's key; bump it when a change makes the same setup and seed step differently.
+ENGINE_VERSION = 1
 
 @dataclass
 class SimulationSetup():
@@ -11,105 +30,507 @@ class SimulationSetup():
     offsets: list
     names: list
 
+    def canonical(self):
+        return canonical([self.n, self.state_count, self.rules, self.colors, self.offsets, self.names])
+
 class Simulation:
-    def __init__(self, setup, size, history_flag=False):
+    def __init__(self, setup, size, history_flag=False, engine="auto", wrap=False, replicas=None, seed=None, rng="generator",
+                 engine_options=None, cells=None, density=None):
         self.n = setup.n
         self.size = size
+        # Periodic boundary instead of the default fixed one where outside cells count as no state.
+        self.wrap = wrap
         self.state_count = setup.state_count
-        self.shape = (size,) * setup.n
+        # With replicas=R the grid is (R, *shape): R independent runs stepped together, each with its
+        # own random stream. Counts and history then have a leading replica axis.
+        self.replicas = replicas
+        self._batch = (replicas,) if replicas else ()
+        # All randomness (initial grid, stochastic rules) comes from here; rng="counter" makes draws
+        # depend only on (seed, step, cell), independent of how the grid is split up.
+        self.random = GridRandom(seed, rng, replicas)
+        self.rng = self.random.generators[0]
+        self.shape = self._batch + (size,) * setup.n
         self.states = None
         self.states_dict = {}
-        self.grid = None
         self.offsets = setup.offsets
         self.rules = setup.rules
+        self._buffers = None
+        self.engine = None
+        # e.g. {"step_log2": 4} or {"workers": 8, "band_rows": 64}, see ENGINE_OPTIONS.
+        self.engine_options = dict(engine_options or {})
+        # Dense stepping limited to the tiles that can still change (engine="active").
+        self._track_active = False
+        self.active_set = None
+        # Set when the engine has stepped past the dense grid / when the dense grid may have been edited.
+        self._engine_ahead = False
+        self._grid_dirty = False
+        self.generation = 0
+        # Starting grid: live (state 1) cell coordinates, or each cell live with probability density;
+        # by default every cell gets a uniformly random state. The first two never build a dense
+        # grid on the sparse and hashlife engines, see set_cells().
+        if cells is not None and density is not None:
+            raise ValueError("give cells or density, not both")
+        if density is not None and not 0 <= density <= 1:
+            raise ValueError("density must be between 0 and 1")
+        if replicas and (cells is not None or density is not None):
+            raise ValueError("replicas start from random grids only")
+        self.initial_cells = cells
+        self.density = density
         
         self._initialize_states()
         if self.offsets == None:
             self._initialize_offsets()
-        self._randomize_grid()
-        
-        self.neighbors_grid = np.zeros_like(self.grid, dtype=np.uint16)
+        self.table = compile_rules(self.rules, self.state_count, len(self.offsets))
+        if replicas and self.table is None:
+            raise ValueError("replicas need rules that compile_rules can compile")
+        self.planes = self.table.planes if self.table is not None else list(range(self.state_count))
+        self.count_dtype = np.min_scalar_type(len(self.offsets))
+        # A full Moore box can be summed one axis at a time, 2 additions per axis instead of 3**n - 1.
+        self._separable = {tuple(int(d) for d in off) for off in self.offsets} == set(self._moore_offsets(self.n))
+        self._select_engine(engine)
+        self._seed_grid()
 
         self.history_flag = history_flag
-        self.history = []
-        
-    def _max_neighbor_count(self):
-        return 3 ** self.n
+        self.clear_history()
+        # Set by recorder.TrajectoryRecorder while it streams frames to disk.
+        self.recorder = None
+        # Compressed in-memory frames, see record_frames().
+        self.frames = None
+        # Periodic checkpoints, see auto_checkpoint().
+        self.autosave = None
+        # Grid hashing that spots a repeated state, see detect_cycles().
+        self.cycle = None
+
+    def _padded(self, shape):
+        # Only the spatial axes get a halo, never the replica axis.
+        b = len(self._batch)
+        return shape[:b] + tuple(d + 2 for d in shape[b:])
+
+    def _allocate(self, shape):
+        padded = self._padded(shape)
+        self._interior = (slice(None),) * len(self._batch) + tuple(slice(1, -1) for _ in shape[len(self._batch):])
+        self._buffers = [np.full(padded, self.state_count, dtype=self.states.dtype), None]
+        self._front = 0
+        self.kernel = None
+
+    # Working memory (a stencil.SlabKernel over the whole grid) is allocated on the first dense step
+    # and reused by every later one; a step itself allocates nothing that grows with the grid.
+    # Per cell it is 2 bytes for the padded front/back state grids, 2 bytes per counted state
+    # plane (padded one-hot plane + neighbour count) and n - 1 more per counted plane for the
+    # partial sums of a separable Moore sum, plus the rules' workspace (compiler.workspace_bytes):
+    # a lookup table needs 9 bytes of index and output, 25 more when the counted plane depends on
+    # the cell's state and 17 more when it is probabilistic (probabilities, draws, keep mask);
+    # RandomRule needs 8, WeightedRandomRule 4 per state + 9 and MajorityRule 3. Counter-mode
+    # draws add a fixed rng.COUNTER_CHUNK * 16 bytes of scratch.
+    def _allocate_work(self):
+        shape = self._buffers[self._front][self._interior].shape
+        padded = self._padded(shape)
+        if self._buffers[self._front ^ 1] is None:
+            self._buffers[self._front ^ 1] = np.full(padded, self.state_count, dtype=self.states.dtype)
+        self.kernel = SlabKernel(self.table, self.planes, self.offsets, self._separable, self.count_dtype, padded,
+                                 self.states.dtype, len(self._batch))
+        self.active_set = ActiveSet(self, shape) if self._track_active else None
+
+    def _select_engine(self, engine):
+        if self.replicas and engine not in ("auto", "dense"):
+            raise ValueError("replicas run on the dense engine only")
+        options = self.engine_options
+        auto = engine == "auto"
+        if engine == "auto":
+            if self.replicas:
+                engine = "dense"
+            elif self.n == 1 and elementary_rule_number(self.rules) is not None:
+                engine = "elementary"
+            elif self._birth_survival() is not None and not self.wrap:
+                engine = "bitpack"
+            elif self._threads_exact() and (os.cpu_count() or 1) > 1 and np.prod(self.shape) >= THREADS_MIN_CELLS:
+                engine = "threads"
+            else:
+                engine = "dense"
+        # What "auto" resolved to, for reports.
+        self.engine_name = engine
+        accepted = ENGINE_OPTIONS.get(engine, ())
+        if auto:
+            # Options meant for an engine auto did not pick are left unused.
+            options = {k: v for k, v in options.items() if k in accepted}
+        unknown = sorted(set(options) - set(accepted))
+        if unknown:
+            raise ValueError(f"{engine} engine does not take {', '.join(unknown)}")
+        if engine == "elementary":
+            number = elementary_rule_number(self.rules) if self.n == 1 else None
+            if number is None:
+                raise ValueError("elementary engine needs a 1D setup with a single RuleN or SierpinskiRule")
+            from elementary import ElementaryEngine
+            self.engine = ElementaryEngine(self, number)
+        elif engine in ("bitpack", "hashlife"):
+            rule = self._birth_survival()
+            if rule is None:
+                raise ValueError(f"{engine} engine needs a two-state birth/survival rule on the Moore neighbourhood")
+            if self.wrap:
+                raise ValueError(f"{engine} engine does not support wrap")
+            if engine == "bitpack":
+                from bitpack import BitPackEngine
+                self.engine = BitPackEngine(self, *rule)
+            else:
+                if self.n != 2:
+                    raise ValueError("hashlife engine is 2D only")
+                from hashlife import HashLifeEngine
+                self.engine = HashLifeEngine(self, *rule, **options)
+        elif engine == "sparse":
+            rule = self._birth_survival()
+            if rule is None:
+                raise ValueError("sparse engine needs a two-state birth/survival rule on the Moore neighbourhood")
+            if self.wrap:
+                raise ValueError("sparse engine does not support wrap")
+            from sparse import SparseEngine
+            self.engine = SparseEngine(self, *rule)
+        elif engine == "parallel":
+            if self.table is None:
+                raise ValueError("parallel engine needs rules that compile_rules can compile")
+            from parallel import ParallelEngine
+            self.engine = ParallelEngine(self, **options)
+        elif engine == "threads":
+            if self.table is None:
+                raise ValueError("threads engine needs rules that compile_rules can compile")
+            from parallel import ThreadEngine
+            self.engine = ThreadEngine(self, **options)
+        elif engine == "active":
+            if self.table is None or not self.table.deterministic:
+                raise ValueError("active engine needs deterministic rules that compile_rules can compile")
+            self._track_active = True
+        elif engine != "dense":
+            raise ValueError(f"Unknown engine: {engine}")
+        self._grid_dirty = True
+
+    @property
+    def deterministic(self):
+        # Whether the next grid depends on the current one alone.
+        if self.table is not None:
+            return self.table.deterministic
+        return self.n == 1 and elementary_rule_number(self.rules) is not None
+
+    def _threads_exact(self):
+        # Bands give the dense path's grids for deterministic rules, and for stochastic ones only with
+        # rng="counter"; in generator mode their draws depend on the band split (core count, cache
+        # size) and are not checkpointed.
+        return self.table is not None and (self.table.deterministic or self.random.mode == "counter")
+
+    def _birth_survival(self):
+        return birth_survival(self.table) if self._separable else None
+
+    def _dense(self):
+        # The dense window is only built when something reads it, so a run seeded from coordinates
+        # on the sparse or hashlife engine has none until then.
+        if self._buffers is None:
+            self._allocate(self.shape)
+            self._buffers[self._front][self._interior] = self.states[0]
+        if self._engine_ahead:
+            self.engine.store(self._buffers[self._front][self._interior])
+            self._engine_ahead = False
+        return self._buffers[self._front][self._interior]
+
+    @property
+    def grid(self):
+        # Read-only view: looking at the grid never makes the engine reload it. Edit it through
+        # edit_grid() or by assigning to sim.grid.
+        view = self._dense().view()
+        view.flags.writeable = False
+        return view
+
+    def edit_grid(self):
+        # Writable view of the grid; the engine reloads it before its next step.
+        self._grid_dirty = True
+        return self._dense()
+
+    @grid.setter
+    def grid(self, value):
+        value = np.asarray(value)
+        if self._buffers is None or value.shape != self._buffers[self._front][self._interior].shape:
+            self._allocate(value.shape)
+        self._engine_ahead = False
+        self._grid_dirty = True
+        self._buffers[self._front][self._interior] = value
 
     def _initialize_states(self):
-        self.states = np.array([int(self._max_neighbor_count() ** (i)) for i in range(self.state_count)], dtype=np.uint64)
+        # Cells hold state indices directly; state_count itself is kept free as the out-of-grid marker.
+        self.states = np.arange(self.state_count, dtype=np.min_scalar_type(self.state_count))
         for i in range(len(self.states)):
             self.states_dict[self.states[i]] = i
 
     def _randomize_grid(self):
-        self.grid = np.random.choice(self.states, size=self.shape)
+        if self.replicas:
+            self.grid = np.stack([rng.choice(self.states, size=self.shape[1:]) for rng in self.random.generators])
+            return
+        self.grid = self.rng.choice(self.states, size=self.shape)
 
-    def _initialize_offsets(self):
-        self.offsets = []
-        for delta in np.ndindex(*(3,) * self.n):
+    def _random_cells(self, density):
+        # Every cell is live with probability density. Live positions are drawn as geometric gaps
+        # between them, so memory follows the population rather than the volume.
+        volume = int(np.prod(self.shape))
+        if density == 0:
+            return np.zeros((0, self.n), dtype=np.int64)
+        runs = []
+        last = -1
+        while last < volume - 1:
+            gaps = self.rng.geometric(density, size=max(1024, int((volume - last) * density * 1.1)))
+            run = last + np.cumsum(gaps)
+            runs.append(run[run < volume])
+            last = run[-1]
+        return np.stack(np.unravel_index(np.concatenate(runs), self.shape), axis=1)
+
+    def set_cells(self, cells):
+        # Grid holding exactly the given live (state 1) cells, as an (k, n) array of coordinates, all
+        # others in state 0. The sparse and hashlife engines take them as they are, cells outside the
+        # window included, without a dense grid; other engines get the cells inside the window.
+        if self.replicas:
+            raise ValueError("replicas start from random grids only")
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, self.n)
+        if hasattr(self.engine, "load_cells"):
+            self.engine.load_cells(cells, self.shape)
+            self._grid_dirty = False
+            self._engine_ahead = True
+            return
+        inside = cells[np.all((cells >= 0) & (cells < self.size), axis=1)]
+        grid = np.full(self.shape, self.states[0], dtype=self.states.dtype)
+        grid[tuple(inside.T)] = self.states[1]
+        self.grid = grid
+
+    def _seed_grid(self):
+        if self.initial_cells is not None:
+            self.set_cells(self.initial_cells)
+        elif self.density is not None:
+            self.set_cells(self._random_cells(self.density))
+        else:
+            # Loading the random grid merges it into the engine's universe, so empty that first.
+            if hasattr(self.engine, "load_cells"):
+                self.engine.load_cells(np.zeros((0, self.n), dtype=np.int64), self.shape)
+            self._randomize_grid()
+
+    @staticmethod
+    def _moore_offsets(n):
+        offsets = []
+        for delta in np.ndindex(*(3,) * n):
             offset = tuple(d - 1 for d in delta)
             if any(offset):
-                self.offsets.append(offset)
-
-    def reset(self):
-        self.grid = self._initialize_grid()
+                offsets.append(offset)
+        return offsets
 
-    def _compute_neighbors(self):
-        pad = 1
-        padded = np.pad(self.grid, [(pad, pad)] * self.n, mode='constant', constant_values=0)
+    def _initialize_offsets(self):
+        self.offsets = self._moore_offsets(self.n)
 
-        self.neighbors_grid = np.zeros_like(self.grid, dtype=np.uint64)
+    def reset(self):
+        # Fresh starting grid at generation 0: the same cells, or a new random fill continuing the
+        # same random stream.
+        self._seed_grid()
+        self.generation = 0
+        self.clear_history()
+        if self.frames is not None:
+            self.record_frames(self.frames.keyframe_interval)
+        if self.cycle is not None:
+            self.cycle.clear()
+        if self.autosave is not None:
+            self.autosave.restart()
 
-        for off in self.offsets:
-            slices = []
-            for shift in off:
-                if shift == -1:
-                    slices.append(slice(0, -2))
-                elif shift == 0:
-                    slices.append(slice(1, -1))
-                elif shift == +1:
-                    slices.append(slice(2, None))
+    def _update_halo(self):
+        update_halo(self._buffers[self._front], self.wrap, self.state_count, len(self._batch))
 
-            shifted = padded[tuple(slices)]
-            self.neighbors_grid += shifted
+    def _load_engine(self):
+        if self._grid_dirty:
+            self.engine.load(self._dense())
+            self._grid_dirty = False
 
     def step(self):
-        self._compute_neighbors()
-        new_grid = self.grid.copy()
-        for index in np.ndindex(self.shape):
-            neighbor = Neighbor(self.n, self.states, self.neighbors_grid[index], index)
-            state = self.states_dict.get(self.grid[index], -1)
-            if state != -1:
-                new_grid[index] = self.states[self.rules.check(state, neighbor, self)]
-        self.grid = new_grid
+        if self.engine is not None:
+            self._load_engine()
+            self.engine.step()
+            self._engine_ahead = True
+            self.generation += self.engine.generations_per_step
+        else:
+            self._step_dense()
+            self._front ^= 1
+            self.generation += 1
         if (self.history_flag):
             self.record_history()
+        # The recorder, frames and cycle detection read the dense window, so with them a sparse or
+        # hashlife run rasterises it every step.
+        if self.recorder is not None:
+            self.recorder.capture(self._dense())
+        if self.frames is not None:
+            self.frames.append(self._dense())
+        if self.cycle is not None:
+            self.cycle.update(self._dense(), self.generation)
+        if self.autosave is not None:
+            self.autosave.step()
+
+    def _step_dense(self):
+        if self.kernel is None:
+            self._allocate_work()
+        tracker = self.active_set
+        if tracker is not None and self._grid_dirty:
+            tracker.reset()
+        self._grid_dirty = False
+        if tracker is not None and tracker.sparse:
+            self._update_halo()
+            tracker.step(self._buffers[self._front], self._buffers[self._front ^ 1])
+            return
+        self._update_halo()
+        if self.table is not None:
+            self.kernel.run(self._buffers[self._front], self._back(), self._uniform)
+        else:
+            self.kernel.count(self._buffers[self._front])
+            self._apply_rules()
+        if tracker is not None:
+            tracker.swept(self._dense(), self._back())
+
+    @property
+    def active_cells(self):
+        # Cells recomputed by the last step.
+        if self.active_set is not None:
+            return self.active_set.active_cells
+        return int(np.prod(self.shape))
+
+    def _back(self):
+        return self._buffers[self._front ^ 1][self._interior]
+
+    def _uniform(self, shape, out=None):
+        return self.random.uniform(shape, self.generation, out=out)
+
+    @property
+    def rng_state(self):
+        # Plain-data RNG state for checkpoints; assigning it back continues the same sequence.
+        return self.random.state
+
+    @rng_state.setter
+    def rng_state(self, value):
+        self.random.state = value
+        self.rng = self.random.generators[0]
+
+    def _apply_rules(self):
+        grid = self._dense()
+        new_grid = self._back()
+        np.copyto(new_grid, grid)
+        for index in np.ndindex(grid.shape):
+            neighbor = Neighbor(self.n, self.states, self.kernel.counts[(slice(None),) + index], index)
+            state = self.states_dict.get(grid[index], -1)
+            if state != -1:
+                new_grid[index] = self.rules.check(state, neighbor, self)
+
+    def advance(self, generations):
+        # Jumps ahead without recording history, in one go when the engine can (Hashlife, additive 1D rules).
+        # Cycle detection has to see every generation, so until it has found the period it makes
+        # advance step one generation at a time.
+        tracking = self.cycle is not None and self.cycle.period is None
+        if self.engine is not None and hasattr(self.engine, "advance") and not tracking:
+            self._load_engine()
+            self.engine.advance(generations)
+            self._engine_ahead = True
+            self.generation += generations
+            if self.autosave is not None:
+                self.autosave.step()
+            return
+        history_flag, self.history_flag = self.history_flag, False
+        for _ in range(generations):
+            self.step()
+        self.history_flag = history_flag
+
+    def spacetime(self, steps, stride=1):
+        # Rows of a 1D run as a (steps, size) array, one every stride generations. The elementary
+        # engine skips unpacking the rows in between, unless history, a recorder, frames or cycle
+        # detection need every generation.
+        every = self.history_flag or self.recorder is not None or self.frames is not None or self.cycle is not None
+        if self.engine is not None and hasattr(self.engine, "spacetime") and (stride == 1 or not every):
+            self._load_engine()
+            rows = self.engine.spacetime(steps, stride)
+            self._engine_ahead = True
+            self.generation += steps * stride
+            if self.history_flag:
+                self._append_history(count_states(rows, self.state_count, per_slice=True))
+            if self.recorder is not None:
+                for row in rows:
+                    self.recorder.capture(row)
+            if self.frames is not None:
+                for row in rows:
+                    self.frames.append(row)
+            if self.cycle is not None:
+                start = self.generation - len(rows)
+                for t, row in enumerate(rows, 1):
+                    self.cycle.update(row, start + t)
+            if self.autosave is not None:
+                self.autosave.step()
+            return rows
+        rows = np.empty((steps,) + self._dense().shape, dtype=self.states.dtype)
+        for t in range(steps):
+            for _ in range(stride):
+                self.step()
+            rows[t] = self._dense()
+        return rows
+
+    def state_counts(self):
+        if self._engine_ahead:
+            return self.engine.state_counts()
+        grid = self._dense()
+        if self.replicas:
+            # (R, state_count)
+            return count_states(grid, self.state_count, per_slice=True)
+        return count_states(grid, self.state_count).tolist()
 
     def record_history(self):
-        counts = [np.sum(self.grid == state) for state in self.states]
-        self.history.append(counts)
+        self._append_history(np.asarray(self.state_counts())[None])
+
+    def _append_history(self, counts):
+        # counts: (steps, [R,] state_count) rows appended to the preallocated buffer.
+        end = self._history_len + len(counts)
+        if end > len(self._history):
+            grown = np.zeros((max(end, 2 * len(self._history)),) + self._history.shape[1:], dtype=self._history.dtype)
+            grown[:self._history_len] = self._history[:self._history_len]
+            self._history = grown
+        self._history[self._history_len:end] = counts
+        self._history_len = end
+
+    @property
+    def history(self):
+        # (steps, [R,] state_count) view of the recorded rows, no copy.
+        return self._history[:self._history_len]
+
+    def history_array(self):
+        # (steps, state_count), or (R, steps, state_count) for replicas, no copy.
+        return np.moveaxis(self.history, 0, len(self._batch))
 
     def clear_history(self):
-        self.history = []
+        self._history = np.zeros((HISTORY_CAPACITY,) + self._batch + (self.state_count,), dtype=np.int64)
+        self._history_len = 0
+
+    def record_frames(self, keyframe_interval=KEYFRAME_INTERVAL):
+        # Starts a FrameHistory holding the current grid as frame 0 and every grid after a step.
+        self.frames = FrameHistory(self._dense().shape, self.state_count, keyframe_interval)
+        self.frames.append(self._dense())
+        return self.frames
+
+    def detect_cycles(self, window=CYCLE_WINDOW):
+        # Starts hashing the grid after every step; cycle.period is set once a state repeats.
+        return CycleDetector(self, window)
+
+    def save_checkpoint(self, path):
+        # Grid, generation, RNG state, history and frames, see checkpoint.save().
+        checkpoint.save(self, path)
+
+    def load_checkpoint(self, path):
+        # Continues exactly where save_checkpoint() left off; the setup, size and boundary must match.
+        checkpoint.load(self, path)
+
+    def auto_checkpoint(self, path, every=None, seconds=None):
+        # Saves to path every `every` generations and/or `seconds` seconds, checked after each step.
+        return checkpoint.AutoCheckpoint(self, path, every, seconds)
 
 class Neighbor:
-    def __init__(self, n, states, value, location):
+    def __init__(self, n, states, counts, location):
         self.location = location
         self.n = n
         self.states = states
         self.state_count = len(states)
-        self.value = value
         self.neighbors = []
-        self.compute_neighbors()
-        
-    def compute_neighbors(self):
-        for i in range(len(self.states)-1):
-            a = self.value % self.states[i+1]
-            self.neighbors.append(int(a/self.states[i]))
-            self.value -= a
-        self.neighbors.append(int(self.value//self.states[-1]))
-
-    def update(self, value):
-        self.value = value
-        self.compute_neighbors()
+        self.update(counts)
+
+    def update(self, counts):
+        self.neighbors = [int(c) for c in counts]
 
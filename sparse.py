@@ -0,0 +1,96 @@
+import numpy as np
+
+class SparseEngine:
+    # Two-state birth/survival rules on an unbounded grid of any dimension, storing only the live
+    # cells as a sorted array of packed coordinates. Each step adds every neighbour offset to every
+    # live cell and counts the repeats, so time and memory follow the population, not the volume.
+    # Like Hashlife there is no boundary: sim.grid is the window [0, size)**n of an infinite lattice.
+    generations_per_step = 1
+
+    def __init__(self, sim, birth, survival):
+        if 0 in birth:
+            raise ValueError("sparse engine needs a rule without birth on 0 neighbours")
+        self.n = sim.n
+        # Coordinates are packed into one int64 key, most significant axis first, so sorted keys are
+        # in row-major order. Each axis gets `bits` bits and is stored offset by `bias`.
+        self.bits = 63 // self.n
+        self.bias = 1 << (self.bits - 1)
+        self.shifts = np.array([self.bits * (self.n - 1 - i) for i in range(self.n)], dtype=np.int64)
+        offsets = np.array(sim._moore_offsets(self.n), dtype=np.int64)
+        self.deltas = (offsets << self.shifts).sum(axis=1)
+        self.born = np.zeros(3 ** self.n, dtype=bool)
+        self.born[[b for b in birth if b < len(self.born)]] = True
+        self.kept = np.zeros(3 ** self.n, dtype=bool)
+        self.kept[[s for s in survival if s < len(self.kept)]] = True
+        self.cells = np.zeros(0, dtype=np.int64)
+        self.shape = (0,) * self.n
+
+    def _check_range(self, coords):
+        # One cell of slack on each side, so adding a neighbour offset never carries into the next axis.
+        if len(coords) and (coords.min() <= 1 - self.bias or coords.max() >= self.bias - 1):
+            raise OverflowError("pattern outside the packable coordinate range")
+
+    def pack(self, coords):
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, self.n)
+        self._check_range(coords)
+        return ((coords + self.bias) << self.shifts).sum(axis=1)
+
+    def unpack(self, keys):
+        return ((keys[:, None] >> self.shifts) & ((1 << self.bits) - 1)) - self.bias
+
+    def load(self, grid):
+        # The window's live cells replace those inside it; the rest of the lattice is kept.
+        cells = self.live_cells()
+        inside = self._inside(cells, (0,) * self.n, grid.shape)
+        self.load_cells(np.concatenate([cells[~inside], np.argwhere(grid == 1)]), grid.shape)
+
+    def load_cells(self, cells, shape):
+        # Live cells given as coordinates, which may lie outside the window.
+        self.shape = tuple(shape)
+        self.cells = np.sort(self.pack(cells))
+
+    def step(self):
+        cells = self.cells
+        if len(cells) == 0:
+            return
+        candidates, counts = np.unique((cells[:, None] + self.deltas).ravel(), return_counts=True)
+        pos = np.minimum(np.searchsorted(cells, candidates), len(cells) - 1)
+        alive = cells[pos] == candidates
+        nxt = candidates[np.where(alive, self.kept[counts], self.born[counts])]
+        if self.kept[0]:
+            # Isolated live cells never show up as candidates.
+            pos = np.minimum(np.searchsorted(candidates, cells), len(candidates) - 1)
+            nxt = np.union1d(nxt, cells[candidates[pos] != cells])
+        self.cells = nxt
+        self._check_range(self.live_cells())
+
+    @property
+    def population(self):
+        return len(self.cells)
+
+    def live_cells(self):
+        return self.unpack(self.cells)
+
+    def bounding_box(self):
+        if len(self.cells) == 0:
+            return None
+        coords = self.live_cells()
+        return tuple(int(v) for v in coords.min(axis=0)), tuple(int(v) + 1 for v in coords.max(axis=0))
+
+    def _inside(self, coords, lo, shape):
+        return np.all((coords >= lo) & (coords < np.add(lo, shape)), axis=1)
+
+    def window(self, lo, shape):
+        # Dense 0/1 export of the box [lo, lo + shape).
+        out = np.zeros(shape, dtype=np.uint8)
+        coords = self.live_cells()
+        coords = coords[self._inside(coords, lo, shape)] - np.asarray(lo, dtype=np.int64)
+        out[tuple(coords.T)] = 1
+        return out
+
+    def store(self, grid):
+        grid[...] = self.window((0,) * self.n, self.shape)
+
+    def state_counts(self):
+        alive = int(np.count_nonzero(self._inside(self.live_cells(), (0,) * self.n, self.shape)))
+        return [int(np.prod(self.shape)) - alive, alive]
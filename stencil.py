@@ -0,0 +1,84 @@
+import numpy as np
+from compiler import global_uniform, workspace_bytes
+
+def count_states(grid, state_count, per_slice=False):
+    # State counts of a state-index grid in one bincount pass; per_slice counts every slice along
+    # the first axis separately (replicas, spacetime rows).
+    if not per_slice:
+        return np.bincount(grid.reshape(-1), minlength=state_count)[:state_count]
+    n = grid.shape[0]
+    flat = grid.reshape(n, -1) + (np.arange(n, dtype=np.intp) * state_count)[:, None]
+    return np.bincount(flat.reshape(-1), minlength=n * state_count).reshape(n, state_count)
+
+def update_halo(front, wrap, state_count, batch=0):
+    # Only the one-cell border of the axes after the first `batch` ones is touched. With a fixed
+    # boundary it holds state_count, which matches no plane; with wrap it mirrors the opposite face
+    # (corners follow axis by axis).
+    for axis in range(batch, front.ndim):
+        lead = (slice(None),) * axis
+        if wrap:
+            front[lead + (0,)] = front[lead + (-2,)]
+            front[lead + (-1,)] = front[lead + (1,)]
+        else:
+            front[lead + (0,)] = state_count
+            front[lead + (-1,)] = state_count
+
+class SlabKernel:
+    # Neighbour counts and next states of a padded block of cells, with working memory allocated
+    # once. The dense path runs it on the whole grid, the thread and process engines on one band
+    # each and the active set on a stack of tile windows. The first `batch` axes (replicas, tiles)
+    # have no halo.
+    def __init__(self, table, planes, offsets, separable, count_dtype, padded, dtype, batch=0):
+        self.table = table
+        self.separable = separable
+        self.batch = batch
+        self.padded = tuple(padded)
+        shape = self.padded[:batch] + tuple(d - 2 for d in self.padded[batch:])
+        self.plane_values = np.array(planes, dtype=dtype).reshape((-1,) + (1,) * len(shape))
+        self.onehot = np.zeros((len(planes),) + self.padded, dtype=bool)
+        # counts[i] holds, per cell, the number of neighbours in state planes[i]
+        self.counts = np.zeros((len(planes),) + shape, dtype=count_dtype)
+        self.partial = []
+        if separable:
+            for axis in range(batch + 1, len(shape)):
+                self.partial.append(np.zeros((len(planes),) + shape[:axis] + self.padded[axis:], dtype=count_dtype))
+        lead = (slice(None),) * (1 + batch)
+        self.offset_slices = [lead + tuple(slice(1 + d, d - 1 if d < 1 else None) for d in off) for off in offsets]
+        self.cells = (slice(None),) * batch + (slice(1, -1),) * (len(shape) - batch)
+        self.work = table.workspace(shape, count_dtype) if table is not None else None
+
+    @staticmethod
+    def cell_bytes(sim):
+        # Working memory per cell: source and destination states, one-hot planes, counts, partial
+        # sums and the rules' workspace.
+        count = np.dtype(sim.count_dtype).itemsize
+        planes = len(sim.planes)
+        size = 2 + planes * (1 + count) + workspace_bytes(sim.table)
+        if sim._separable:
+            size += (sim.n - 1) * planes * count
+        return size
+
+    def count(self, src):
+        # src: padded states with the halo up to date; returns the per-plane neighbour counts.
+        np.equal(src[None], self.plane_values, out=self.onehot)
+        counts = self.counts
+        if self.separable:
+            # Three-tap sum along each spatial axis in turn; every pass trims that axis' halo.
+            plane = self.onehot
+            for axis, out in enumerate(self.partial + [counts], self.batch):
+                lead = (slice(None),) * (axis + 1)
+                left, mid, right = (plane[lead + (slice(a, plane.shape[axis + 1] - 2 + a),)] for a in range(3))
+                np.add(left, mid, out=out, dtype=counts.dtype)
+                np.add(out, right, out=out)
+                plane = out
+            np.subtract(counts, self.onehot[(slice(None),) + self.cells], out=counts)
+        else:
+            counts.fill(0)
+            for sl in self.offset_slices:
+                np.add(counts, self.onehot[sl], out=counts)
+        return counts
+
+    def run(self, src, dst, random=global_uniform):
+        # Next states of src's cells into dst (a new array when dst is None), which is returned.
+        counts = self.count(src)
+        return self.table.apply(src[self.cells], counts, random=random, out=dst, work=self.work)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import glob
+import hashlib
+import argparse
+import itertools
+import traceback
+import numpy as np
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+from simulation import Simulation
+import setups
+from setups_1d import setup_from_1d
+from setups_2d import setup_from_b_s, cyclic_setup_factory, prey_predator_setup_factory
+
+# Setup factories a sweep entry can name; its other keys (except the run keys) are their arguments.
+FACTORIES = {
+    "preset": lambda name: setups.setups[name],
+    "bs": setup_from_b_s,
+    "cyclic": cyclic_setup_factory,
+    "prey_predator": prey_predator_setup_factory,
+    "elementary": setup_from_1d,
+}
+# Keys that configure the run rather than the setup, with their defaults.
+RUN_KEYS = {"size": 30, "steps": 2000, "init_steps": 25, "seed": 0}
+
+# Each entry is a grid: every key maps to a list of values (or one value) and every combination is one job.
+SWEEP = [
+    {"factory": "bs", "rule_string": [f"B{b}/S{s}" for b in ("3", "36", "37", "38") for s in ("23", "234", "1234", "12345")],
+     "seed": list(range(4))},
+    {"factory": "cyclic", "n": [3, 4, 5, 6, 8, 10, 12, 16], "seed": list(range(4))},
+    {"factory": "prey_predator", "prey_birth": [0.6, 0.8, 1.0], "predation": [0.2, 0.4, 0.6], "seed": list(range(4))},
+]
+
+JOB_TIMEOUT = 600
+# Every results part has these columns (besides the job ones), with these values when a job did not finish.
+RESULT_DEFAULTS = {"status": "", "error": "", "seconds": float("nan"), "lifetime": -1, "final_states": -1,
+                   "mean_entropy": float("nan"), "final_counts": "", "period": -1, "transient": -1}
+# Finished jobs are written out in parts of this many rows (and whenever FLUSH_SECONDS have passed).
+FLUSH_ROWS = 64
+FLUSH_SECONDS = 30
+
+def expand(grid):
+    # Jobs of a sweep, in order, each a flat dict with the run keys filled in.
+    jobs = []
+    for entry in grid:
+        keys = list(entry)
+        choices = [entry[k] if isinstance(entry[k], (list, tuple, range)) else [entry[k]] for k in keys]
+        for values in itertools.product(*choices):
+            job = dict(RUN_KEYS)
+            job.update(zip(keys, values))
+            jobs.append(job)
+    return jobs
+
+def job_id(job):
+    return hashlib.sha1(json.dumps(job, sort_keys=True).encode()).hexdigest()[:16]
+
+def make_setup(job):
+    args = {k: v for k, v in job.items() if k != "factory" and k not in RUN_KEYS}
+    return FACTORIES[job["factory"]](**args)
+
+def measure(history, steps):
+    # Diversity metrics of a (steps, state_count) history.
+    history = np.asarray(history, dtype=np.float64)
+    alive = (history > 0).sum(axis=1)
+    low = np.flatnonzero(alive < 2)
+    p = history / history.sum(axis=1, keepdims=True)
+    entropy = -np.where(p > 0, p * np.log2(np.where(p > 0, p, 1)), 0).sum(axis=1)
+    return {"lifetime": int(low[0]) if len(low) else steps, "final_states": int(alive[-1]) if len(alive) else 0,
+            "mean_entropy": float(entropy.mean()) if len(entropy) else 0.0,
+            "final_counts": json.dumps(history[-1].astype(int).tolist() if len(history) else [])}
+
+def run_job(job, plot_dir=None):
+    setup = make_setup(job)
+    sim = Simulation(setup, job["size"], True, seed=job["seed"])
+    for _ in range(job["init_steps"]):
+        sim.step()
+    sim.clear_history()
+    cycle = sim.detect_cycles() if sim.deterministic else None
+    for _ in range(job["steps"]):
+        sim.step()
+        if cycle is not None and cycle.period is not None:
+            break
+    history = sim.history
+    result = {"period": -1, "transient": -1}
+    if cycle is not None and cycle.period is not None:
+        history = cycle.extrapolate(history, job["steps"])
+        result = {"period": cycle.period, "transient": cycle.transient}
+    result.update(measure(history, job["steps"]))
+    if plot_dir:
+        plot(history, setup, f"{plot_dir}/{job_id(job)}.png", json.dumps(job, sort_keys=True))
+    return result
+
+def plot(history, setup, path, title):
+    # Runs in worker processes, so only the non-interactive backend is used.
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    colors = [tuple(c / 255.0 for c in col) for col in setup.colors] if getattr(setup, "colors", None) else None
+    fig = plt.figure(figsize=(10, 6))
+    plt.stackplot(np.arange(len(history)), np.asarray(history).T, labels=setup.names, colors=colors)
+    plt.title(title, fontsize=8)
+    plt.xlabel("Step")
+    plt.ylabel("Number of cells")
+    plt.legend(loc="upper left")
+    plt.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+def _worker(job, plot_dir, conn):
+    start = time.perf_counter()
+    try:
+        result = run_job(job, plot_dir)
+        result.update(status="ok", error="")
+    except Exception:
+        result = {"status": "error", "error": traceback.format_exc(limit=3)}
+    result["seconds"] = time.perf_counter() - start
+    conn.send(result)
+    conn.close()
+
+def load_results(path):
+    # All parts of a results directory as one dict of column arrays.
+    parts = []
+    for name in sorted(glob.glob(os.path.join(path, "part_*.npz"))):
+        with np.load(name) as data:
+            parts.append({k: data[k] for k in data.files})
+    if not parts:
+        return {}
+    return {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+
+class ResultWriter:
+    # Buffers finished rows and writes them as numbered column-per-array .npz parts, each written
+    # to a temporary name and renamed, so a crash loses at most the unflushed rows.
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.rows = []
+        self.part = len(glob.glob(os.path.join(path, "part_*.npz")))
+        self.time = time.monotonic()
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= FLUSH_ROWS or time.monotonic() - self.time >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        self.time = time.monotonic()
+        if not self.rows:
+            return
+        keys = sorted({k for row in self.rows for k in row})
+        columns = {}
+        for k in keys:
+            values = [row.get(k) for row in self.rows]
+            if all(isinstance(v, (int, float, np.integer, np.floating)) for v in values):
+                columns[k] = np.array(values)
+            else:
+                columns[k] = np.array(["" if v is None else str(v) for v in values])
+        name = os.path.join(self.path, f"part_{self.part:06d}.npz")
+        with open(name + ".tmp", "wb") as f:
+            np.savez(f, **columns)
+        os.replace(name + ".tmp", name)
+        self.part += 1
+        self.rows = []
+
+def run_sweep(grid, path, workers=None, timeout=JOB_TIMEOUT, plot_dir=None):
+    # Runs every job of the grid not already in `path`, at most `workers` at a time, each in a
+    # process of its own that is killed after `timeout` seconds.
+    jobs = expand(grid)
+    done = set(load_results(path).get("job", []))
+    pending = [(job_id(job), job) for job in jobs if job_id(job) not in done]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done")
+    total = len(pending)
+    if plot_dir:
+        os.makedirs(plot_dir, exist_ok=True)
+    writer = ResultWriter(path)
+    workers = workers or os.cpu_count() or 1
+    ctx = mp.get_context()
+    running = {}
+    finished = 0
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                key, job = pending.pop(0)
+                recv, send = ctx.Pipe(duplex=False)
+                p = ctx.Process(target=_worker, args=(job, plot_dir, send), daemon=True)
+                p.start()
+                send.close()
+                running[recv] = (key, job, p, time.monotonic() + timeout)
+            deadline = min(d for _, _, _, d in running.values())
+            for recv in wait(list(running), timeout=max(0.0, deadline - time.monotonic())):
+                key, job, p, _ = running.pop(recv)
+                try:
+                    result = recv.recv()
+                except EOFError:
+                    result = {"status": "error", "error": f"worker exited with code {p.exitcode}", "seconds": float("nan")}
+                recv.close()
+                p.join()
+                finished += 1
+                writer.add(_row(key, job, result))
+                print(f"[{finished}/{total}] {result['status']:7s} {result['seconds']:7.2f}s {json.dumps(job, sort_keys=True)}")
+            now = time.monotonic()
+            for recv, (key, job, p, deadline) in list(running.items()):
+                if now >= deadline:
+                    p.terminate()
+                    p.join()
+                    recv.close()
+                    del running[recv]
+                    finished += 1
+                    writer.add(_row(key, job, {"status": "timeout", "error": "", "seconds": float(timeout)}))
+                    print(f"[{finished}/{total}] timeout {json.dumps(job, sort_keys=True)}")
+    finally:
+        for _, _, p, _ in running.values():
+            p.terminate()
+        writer.flush()
+
+def _row(key, job, result):
+    row = {"job": key, "params": json.dumps(job, sort_keys=True), "factory": job["factory"],
+           "size": job["size"], "steps": job["steps"], "seed": job["seed"]}
+    row.update(RESULT_DEFAULTS)
+    row.update(result)
+    return row
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a parameter sweep, skipping jobs already in the results directory.")
+    parser.add_argument("results", help="results directory (column parts, read back with load_results)")
+    parser.add_argument("--grid", help="JSON file with a list of grids; defaults to SWEEP")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT, help="seconds per job")
+    parser.add_argument("--plots", default=None, help="directory for one stacked plot per job")
+    args = parser.parse_args()
+    grid = SWEEP
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    run_sweep(grid, args.results, args.workers, args.timeout, args.plots)
@@ -11,6 +11,7 @@ from PyQt6.QtGui import QColor, QPainter, QBrush
 
 import setups_1d
 from simulation import Simulation, SimulationSetup
+from framehistory import FrameHistory
 
 class GridWidget1D(QWidget):
     def __init__(self, sim: Simulation, setup: SimulationSetup, history, state_count):
@@ -58,16 +59,15 @@ class GridWidget1D(QWidget):
         cell_h = height / rows
         x = int(event.position().x() // cell_w)
         y = int(event.position().y() // cell_h)
-        if 0 <= x < cols and 0 <= y < rows:
+        # Earlier rows are decoded from the recorded run, so only the current generation is editable.
+        if 0 <= x < cols and y == rows - 1:
             curr = int(self.history[y, x])
             nxt = (curr + 1) % self.state_count
             self.history[y, x] = nxt
-            if y == rows - 1:
-                try:
-                    encoded = int(self.sim.states[nxt])
-                    self.sim.grid[x] = encoded
-                except Exception:
-                    pass
+            self.sim.edit_grid()[x] = nxt
+            frames = self.sim.frames
+            frames.truncate(len(frames) - 1)
+            frames.append(self.sim.grid)
             self.update()
 
 class SimulationWidget1D(QWidget):
@@ -78,6 +78,7 @@ class SimulationWidget1D(QWidget):
 
         self.width_cells = 101
         self.height_rows = 200
+        self.wrap = False
 
         self.current_setup_name = None
         for k, s in setups_dict.items():
@@ -88,11 +89,9 @@ class SimulationWidget1D(QWidget):
             raise RuntimeError("No 1D setup found in setups_dict")
         self.current_setup = setups_dict[self.current_setup_name]
 
-        self.sim = Simulation(self.current_setup, self.width_cells)
+        self.sim = Simulation(self.current_setup, self.width_cells, wrap=self.wrap)
 
         self.state_count = self.sim.state_count
-        self.history = np.zeros((self.height_rows, self.width_cells), dtype=np.uint8)
-
         self._fill_history_from_sim(initial=True)
 
         self.timer = QTimer()
@@ -161,19 +160,18 @@ class SimulationWidget1D(QWidget):
         self.change_speed()
 
     def _fill_history_from_sim(self, initial=False):
-        cols = self.width_cells
-        mapper = self.sim.states_dict
-        try:
-            idxs = np.fromiter((mapper.get(int(v), 0) for v in self.sim.grid.flatten()), dtype=np.uint8)
-            idxs = idxs.reshape(-1)
-        except Exception:
-            idxs = np.zeros(cols, dtype=np.uint8)
-            for i, v in enumerate(self.sim.grid.flatten()):
-                idxs[i] = mapper.get(int(v), 0)
-        self.history = np.zeros((self.height_rows, self.width_cells), dtype=np.uint8)
-        self.history[-1, :cols] = idxs[:cols]
+        # The whole run is kept compressed in sim.frames; self.history only holds the visible rows.
+        self.sim.record_frames()
         if hasattr(self, "grid_widget"):
             self.grid_widget.state_count = self.state_count
+        self._update_view()
+
+    def _update_view(self):
+        frames = self.sim.frames
+        count = min(len(frames), self.height_rows)
+        self.history = np.zeros((self.height_rows, self.width_cells), dtype=np.uint8)
+        self.history[self.height_rows - count:] = frames.window(len(frames) - count, len(frames))
+        if hasattr(self, "grid_widget"):
             self.grid_widget.update_history(self.history)
 
     def toggle_sim(self):
@@ -186,15 +184,7 @@ class SimulationWidget1D(QWidget):
 
     def step(self):
         self.sim.step()
-        self.history[:-1] = self.history[1:]
-        mapper = self.sim.states_dict
-        last_indices = np.fromiter((mapper.get(int(v), 0) for v in self.sim.grid.flatten()), dtype=np.uint8)
-        if last_indices.size < self.width_cells:
-            tmp = np.zeros(self.width_cells, dtype=np.uint8)
-            tmp[:last_indices.size] = last_indices
-            last_indices = tmp
-        self.history[-1] = last_indices[:self.width_cells]
-        self.grid_widget.update_history(self.history)
+        self._update_view()
 
     def step_once(self):
         if self.timer.isActive():
@@ -204,11 +194,12 @@ class SimulationWidget1D(QWidget):
 
     def clear_history(self, single_seed=False):
         base = self.sim.states[0]
-        self.sim.grid.fill(base)
+        grid = self.sim.edit_grid()
+        grid.fill(base)
         if single_seed:
             mid = self.width_cells // 2
             if self.sim.state_count > 1:
-                self.sim.grid[mid] = self.sim.states[1]
+                grid[mid] = self.sim.states[1]
         self._fill_history_from_sim(initial=True)
 
     def randomize_history(self):
@@ -221,45 +212,45 @@ class SimulationWidget1D(QWidget):
 
     def change_width(self, value):
         old_width = self.width_cells
-        old_history = self.history.copy()
+        old_frames = self.sim.frames
         old_sim_grid = self.sim.grid.copy()
         self.width_cells = value
-        new_sim = Simulation(self.current_setup, self.width_cells)
+        new_sim = Simulation(self.current_setup, self.width_cells, wrap=self.wrap)
         minw = min(old_width, self.width_cells)
         try:
-            new_sim.grid[:minw] = old_sim_grid[:minw]
+            new_sim.edit_grid()[:minw] = old_sim_grid[:minw]
         except Exception:
             pass
         self.sim = new_sim
         self.state_count = self.sim.state_count
-        new_history = np.zeros((self.height_rows, self.width_cells), dtype=np.uint8)
-        minh = min(old_history.shape[0], new_history.shape[0])
-        minw = min(old_history.shape[1], new_history.shape[1])
-        new_history[:minh, :minw] = old_history[:minh, :minw]
-        self.history = new_history
+        # Carries the visible rows over, cut or zero-padded to the new width.
+        count = min(len(old_frames), self.height_rows)
+        old_rows = old_frames.window(len(old_frames) - count, len(old_frames) - 1)
+        rows = np.zeros((len(old_rows), self.width_cells), dtype=np.uint8)
+        rows[:, :minw] = old_rows[:, :minw]
+        self.sim.frames = FrameHistory((self.width_cells,), self.state_count)
+        for row in rows:
+            self.sim.frames.append(row)
+        self.sim.frames.append(self.sim.grid)
+        self._update_view()
         self.grid_widget.sim = self.sim
         self.grid_widget.setup = self.current_setup
         self.grid_widget.state_count = self.state_count
         self.grid_widget._update_cell_colors()
-        self.grid_widget.update_history(self.history)
 
     def change_height(self, value):
-        old = self.history
         self.height_rows = value
-        self.history = np.zeros((self.height_rows, self.width_cells), dtype=np.uint8)
-        minh = min(old.shape[0], self.history.shape[0])
-        minw = min(old.shape[1], self.history.shape[1])
-        self.history[:minh, :minw] = old[:minh, :minw]
-        self.grid_widget.update_history(self.history)
+        self._update_view()
 
     def change_wrap(self, state):
-        self.wrap = bool(state == Qt.CheckState.Checked)
+        self.wrap = bool(state == Qt.CheckState.Checked.value)
+        self.sim.wrap = self.wrap
 
     def change_setup(self, name):
         setup = self.setups[name]
         self.current_setup_name = name
         self.current_setup = setup
-        self.sim = Simulation(self.current_setup, self.width_cells)
+        self.sim = Simulation(self.current_setup, self.width_cells, wrap=self.wrap)
         self.state_count = self.sim.state_count
         self._fill_history_from_sim(initial=True)
         self.grid_widget.sim = self.sim
@@ -30,9 +30,10 @@ class GridWidget(QWidget):
         cell_width = width / cols
         cell_height = height / rows
 
+        grid = self.sim.grid
         for y in range(rows):
             for x in range(cols):
-                state = self.sim.grid[y, x]
+                state = grid[y, x]
                 color_tuple = self.cell_colors.get(state, (100, 100, 100))
                 painter.setBrush(QBrush(QColor(*color_tuple)))
                 painter.setPen(Qt.GlobalColor.black)
@@ -47,13 +48,8 @@ class GridWidget(QWidget):
         x = int(event.position().x() // cell_width)
         y = int(event.position().y() // cell_height)
         if 0 <= x < cols and 0 <= y < rows:
-            curr_value = self.sim.grid[y, x]
-            try:
-                idx = self.sim.states.tolist().index(curr_value)
-            except ValueError:
-                idx = 0
-            next_idx = (idx + 1) % self.sim.state_count
-            self.sim.grid[y, x] = self.sim.states[next_idx]
+            next_idx = (int(self.sim.grid[y, x]) + 1) % self.sim.state_count
+            self.sim.edit_grid()[y, x] = self.sim.states[next_idx]
             self.update()
             
 class SimulationWidget(QWidget):
@@ -132,7 +128,7 @@ class SimulationWidget(QWidget):
         self.grid_widget.update()
         
     def clear_grid(self):
-        self.sim.grid.fill(self.sim.states[0])
+        self.sim.edit_grid().fill(self.sim.states[0])
         self.grid_widget.update()
 
     def randomize_grid(self):
@@ -84,25 +84,30 @@ class GridWidget(QOpenGLWidget):
         glEnd()
         glPopMatrix()
 
+    def _voxels(self):
+        # (z, y, x) and state of every cell that is not in the background state. Unbounded engines
+        # list their live cells directly, including those outside the [0, size)**3 window.
+        engine = self.sim.engine
+        if engine is not None and hasattr(engine, "live_cells"):
+            cells = engine.live_cells()
+            return cells, np.full(len(cells), self.sim.states[1])
+        grid = self.sim.grid
+        cells = np.argwhere(grid != self.sim.states[0])
+        return cells, grid[tuple(cells.T)]
+
     def _draw_voxels(self):
         size = self.sim.size
-        grid = self.sim.grid
-        sz, sy, sx = grid.shape
         glPushMatrix()
-        glTranslatef(-sx/2.0, -sy/2.0, -sz/2.0)
+        glTranslatef(-size/2.0, -size/2.0, -size/2.0)
         half = 0.45  # voxel half-size
-        for z in range(sz):
-            for y in range(sy):
-                for x in range(sx):
-                    st = grid[z, y, x]
-                    if st == self.sim.states[0]:
-                        continue
-                    color = self.cell_colors.get(st, (0.6, 0.6, 0.6))
-                    glColor4f(color[0], color[1], color[2], 0.1)
-                    glPushMatrix()
-                    glTranslatef(x + 0.5, y + 0.5, z + 0.5)
-                    self._draw_cube(half)
-                    glPopMatrix()
+        cells, states = self._voxels()
+        for (z, y, x), st in zip(cells.tolist(), states):
+            color = self.cell_colors.get(st, (0.6, 0.6, 0.6))
+            glColor4f(color[0], color[1], color[2], 0.1)
+            glPushMatrix()
+            glTranslatef(x + 0.5, y + 0.5, z + 0.5)
+            self._draw_cube(half)
+            glPopMatrix()
         glPopMatrix()
 
     def _draw_cube(self, h):
@@ -249,7 +254,7 @@ class SimulationWidget(QWidget):
         if hasattr(self.sim, 'clear'):
             self.sim.clear()
         else:
-            self.sim.grid.fill(self.sim.states[0])
+            self.sim.edit_grid().fill(self.sim.states[0])
         self.grid_widget.update()
 
     def randomize_grid(self):
@@ -265,7 +270,7 @@ class SimulationWidget(QWidget):
             self.sim.randomize()
         else:
             choices = np.random.rand(self.sim.size, self.sim.size, self.sim.size)
-            self.sim.grid = np.where(choices < 0.12, self.sim.states[1], self.sim.states[0]).astype(np.int32)
+            self.sim.grid = np.where(choices < 0.12, self.sim.states[1], self.sim.states[0]).astype(self.sim.states.dtype)
         self.grid_widget.update()
 
     def change_speed(self):
@@ -277,7 +282,7 @@ class SimulationWidget(QWidget):
             self.sim.resize(value)
         else:
             self.sim.size = value
-            self.sim.grid = np.full((value, value, value), self.sim.states[0], dtype=np.int32)
+            self.sim.grid = np.full((value, value, value), self.sim.states[0], dtype=self.sim.states.dtype)
             if hasattr(self.sim, '_randomize_grid'):
                 try:
                     self.sim._randomize_grid()